@@ -0,0 +1,265 @@
+"""Метрики Prometheus сервиса: HTTP-запросы, пулы соединений с БД и задачи Celery.
+
+Если задана переменная PROMETHEUS_MULTIPROC_DIR, значения метрик
+каждого процесса (воркеры uvicorn, процессы пула Celery) пишутся в
+файлы этого каталога, а /metrics отдаёт их сумму по всем процессам.
+Каталог очищается при старте контейнера, до запуска процессов.
+Без переменной метрики собираются в памяти единственного процесса.
+"""
+import logging
+import os
+import time
+from typing import Iterable, List, Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+from starlette.responses import Response
+from starlette.routing import Match
+
+logger = logging.getLogger(__name__)
+
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Время до начала ответа HTTP-обработчика",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "Запросы, обрабатываемые в данный момент",
+    ["method", "route"],
+    multiprocess_mode="livesum",
+)
+
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_connections_checked_out",
+    "Соединения пула, выданные приложению",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_OPEN = Gauge(
+    "db_pool_connections_open",
+    "Открытые соединения пула",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_CAPACITY = Gauge(
+    "db_pool_capacity",
+    "Максимум соединений пула (pool_size + max_overflow)",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_CHECKOUTS = Counter(
+    "db_pool_checkouts_total",
+    "Выдачи соединений из пула",
+    ["pool"],
+)
+
+CELERY_TASK_DURATION = Histogram(
+    "celery_task_duration_seconds",
+    "Длительность выполнения задач Celery",
+    ["task"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0),
+)
+CELERY_TASK_FAILURES = Counter(
+    "celery_task_failures_total",
+    "Задачи Celery, завершившиеся исключением",
+    ["task"],
+)
+
+# Коллекторы, значения которых читаются в момент опроса (например, длина очередей)
+_scrape_collectors: List = []
+
+
+def metrics_registry() -> CollectorRegistry:
+    """Реестр для ответа /metrics"""
+    if not MULTIPROC_DIR:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    for collector in _scrape_collectors:
+        registry.register(collector)
+    return registry
+
+
+def metrics_response() -> Response:
+    return Response(generate_latest(metrics_registry()), media_type=CONTENT_TYPE_LATEST)
+
+
+def register_scrape_collector(collector):
+    """Коллектор, вызываемый при каждом опросе /metrics"""
+    if MULTIPROC_DIR:
+        _scrape_collectors.append(collector)
+    else:
+        REGISTRY.register(collector)
+
+
+def mark_process_dead(pid: Optional[int] = None):
+    """Удаление live-метрик завершившегося процесса"""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid or os.getpid())
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: длительность запросов по шаблону маршрута.
+
+    Время измеряется до отправки заголовков ответа, поэтому потоковые
+    ответы (SSE) учитываются временем подключения, а не длительностью
+    потока. Путь без подходящего маршрута учитывается как "unmatched",
+    чтобы произвольные URL не порождали новые серии.
+    """
+
+    def __init__(self, app, skip_paths: Iterable[str] = ("/metrics",)):
+        self.app = app
+        self.skip_paths = set(skip_paths)
+
+    @staticmethod
+    def _route(scope) -> str:
+        for route in scope["app"].router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return getattr(route, "path", "unmatched")
+        return "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = self._route(scope)
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(method, route)
+        started = time.perf_counter()
+        recorded = False
+
+        async def send_wrapper(message):
+            nonlocal recorded
+            if message["type"] == "http.response.start" and not recorded:
+                recorded = True
+                HTTP_REQUEST_DURATION.labels(method, route, str(message["status"])).observe(
+                    time.perf_counter() - started
+                )
+            await send(message)
+
+        in_progress.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            if not recorded:
+                HTTP_REQUEST_DURATION.labels(method, route, "500").observe(time.perf_counter() - started)
+            raise
+        finally:
+            in_progress.dec()
+
+
+def instrument_app(app):
+    """Middleware метрик и маршрут GET /metrics"""
+    app.add_middleware(MetricsMiddleware)
+
+    # Синхронный обработчик: коллекторы читают Redis и файлы метрик вне event loop
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return metrics_response()
+
+    @app.on_event("shutdown")
+    async def release_process_metrics():
+        mark_process_dead()
+
+
+def instrument_engine(engine, pool: str):
+    """Учёт соединений пула SQLAlchemy (для async-движка передаётся engine.sync_engine)"""
+    from sqlalchemy import event
+
+    size = getattr(engine.pool, "size", None)
+    overflow = getattr(engine.pool, "_max_overflow", 0)
+    if callable(size):
+        DB_POOL_CAPACITY.labels(pool).set(size() + max(overflow, 0))
+
+    checked_out = DB_POOL_CHECKED_OUT.labels(pool)
+    opened = DB_POOL_OPEN.labels(pool)
+    checkouts = DB_POOL_CHECKOUTS.labels(pool)
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        opened.inc()
+
+    @event.listens_for(engine, "close")
+    def on_close(dbapi_connection, connection_record):
+        opened.dec()
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        checked_out.inc()
+        checkouts.inc()
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        checked_out.dec()
+
+
+class CeleryQueueCollector:
+    """Длина очередей Celery в брокере Redis на момент опроса"""
+
+    def __init__(self, redis_client, queues: Iterable[str] = ("celery",)):
+        self.redis = redis_client
+        self.queues = list(queues)
+
+    def collect(self):
+        family = GaugeMetricFamily("celery_queue_length", "Задачи, ожидающие в очереди брокера", labels=["queue"])
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for queue in self.queues:
+                pipe.llen(queue)
+            for queue, length in zip(self.queues, pipe.execute()):
+                family.add_metric([queue], length)
+        except Exception as e:
+            logger.warning(f"Failed to read Celery queue length: {e}")
+        yield family
+
+
+def instrument_celery(celery_app, metrics_port: Optional[int] = None):
+    """Метрики задач Celery.
+
+    Процессы пула пишут метрики в общий каталог PROMETHEUS_MULTIPROC_DIR.
+    Если воркер запущен вне контейнера API, metrics_port поднимает в
+    главном процессе воркера отдельный HTTP-сервер с теми же метриками.
+    """
+    from celery import signals
+
+    started_at = {}
+
+    @signals.task_prerun.connect(weak=False)
+    def on_task_prerun(task_id=None, **kwargs):
+        started_at[task_id] = time.perf_counter()
+
+    @signals.task_postrun.connect(weak=False)
+    def on_task_postrun(task_id=None, task=None, **kwargs):
+        started = started_at.pop(task_id, None)
+        if started is not None and task is not None:
+            CELERY_TASK_DURATION.labels(task.name).observe(time.perf_counter() - started)
+
+    @signals.task_failure.connect(weak=False)
+    def on_task_failure(sender=None, **kwargs):
+        CELERY_TASK_FAILURES.labels(getattr(sender, "name", "unknown")).inc()
+
+    @signals.worker_process_shutdown.connect(weak=False)
+    def on_worker_process_shutdown(pid=None, **kwargs):
+        mark_process_dead(pid)
+
+    if metrics_port:
+        @signals.worker_init.connect(weak=False)
+        def on_worker_init(**kwargs):
+            from prometheus_client import start_http_server
+            start_http_server(metrics_port, registry=metrics_registry())
+
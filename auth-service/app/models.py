@@ -20,7 +20,10 @@ class Session(Base):
     __tablename__ = "sessions"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, nullable=False)
-    token = Column(Text, nullable=False)
+    user_id = Column(Integer, nullable=False, index=True)
+    token = Column(Text, nullable=False)  # SHA-256 секрета refresh-токена
+    # SHA-256 последних заменённых секретов через пробел, новые первыми
+    rotated_tokens = Column(Text, nullable=True)
     expires_at = Column(DateTime, nullable=False)
+    revoked_at = Column(DateTime, nullable=True, index=True)
     created_at = Column(DateTime, default=func.now())
\ No newline at end of file
@@ -0,0 +1,190 @@
+"""Проверка JWT внутри сервиса без обращения к auth-service.
+
+Токен проверяется локально по общему секрету. Уже проверенные токены
+хранятся в ограниченном LRU-кеше по SHA-256 от токена до истечения
+срока действия, поэтому повторные запросы с тем же токеном не
+декодируют его заново.
+
+Токены отозванных сессий (claim sid) отклоняются по списку отзыва
+(Denylist): его локальная копия загружается из Redis и пополняется
+через pub/sub, поэтому проверка не обращается ни к Redis, ни к базе.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import redis
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from jose import JWTError, jwt
+from pydantic import BaseModel
+
+SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key")
+ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
+# Redis со списком отозванных сессий (общий для всех сервисов)
+AUTH_REDIS_URL = os.getenv("AUTH_REDIS_URL")
+
+logger = logging.getLogger(__name__)
+
+
+class TokenData(BaseModel):
+    username: Optional[str] = None
+    role: Optional[str] = None
+
+
+class Denylist:
+    """Список отозванных сессий.
+
+    Запись живёт в Redis (ключ {prefix}:{sid} с TTL, равным сроку жизни
+    access-токена) и в локальном словаре каждого процесса. Новые записи
+    рассылаются через канал {prefix}, проверка - поиск в словаре.
+    """
+
+    def __init__(self, redis_client=None, prefix: str = "auth:denylist", retry_interval: float = 30.0):
+        self.redis = redis_client
+        self.prefix = prefix
+        self.retry_interval = retry_interval
+        self._entries: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._listener = None
+        self._next_attempt = 0.0
+
+    def _remember(self, sid: str, expires_at: float):
+        with self._lock:
+            self._entries[sid] = max(expires_at, self._entries.get(sid, 0.0))
+
+    def _on_message(self, message):
+        sid, _, expires_at = message['data'].decode().partition(':')
+        self._remember(sid, float(expires_at or 0))
+
+    def _ensure_started(self):
+        """Подписка на изменения и загрузка текущего списка из Redis"""
+        if self.redis is None or self._listener is not None or time.monotonic() < self._next_attempt:
+            return
+        try:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            # Подписка до чтения списка - отзыв между ними не потеряется
+            pubsub.subscribe(**{self.prefix: self._on_message})
+            self._listener = pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+            now = time.time()
+            for key in self.redis.scan_iter(f"{self.prefix}:*", count=1000):
+                ttl = self.redis.ttl(key)
+                if ttl and ttl > 0:
+                    self._remember(key.decode().rsplit(':', 1)[-1], now + ttl)
+        except Exception as e:
+            logger.warning(f"Denylist is unavailable, retrying in {self.retry_interval:.0f}s: {e}")
+            self._listener = None
+            self._next_attempt = time.monotonic() + self.retry_interval
+
+    def add(self, sid: str, ttl: float):
+        """Отзыв сессии на ttl секунд (не меньше срока жизни её access-токенов)"""
+        expires_at = time.time() + ttl
+        self._remember(sid, expires_at)
+        if self.redis is not None:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.set(f"{self.prefix}:{sid}", 1, ex=max(1, int(ttl)))
+            pipe.publish(self.prefix, f"{sid}:{expires_at}")
+            pipe.execute()
+
+    def __contains__(self, sid) -> bool:
+        self._ensure_started()
+        expires_at = self._entries.get(str(sid))
+        if expires_at is None:
+            return False
+        if expires_at < time.time():
+            with self._lock:
+                self._entries.pop(str(sid), None)
+            return False
+        return True
+
+
+class TokenVerifier:
+    """Проверка JWT с LRU-кешем проверенных токенов и списком отзыва"""
+
+    def __init__(self, secret_key: str, algorithm: str, max_entries: int = 10000, default_ttl: float = 300.0,
+                 denylist: Optional[Denylist] = None):
+        self.secret_key = secret_key
+        self.algorithm = algorithm
+        self.max_entries = max_entries
+        # Срок кеширования токенов без exp
+        self.default_ttl = default_ttl
+        self.denylist = denylist
+        self._cache: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def _revoked(self, payload: Dict) -> bool:
+        sid = payload.get("sid")
+        return sid is not None and self.denylist is not None and sid in self.denylist
+
+    def verify(self, token: str) -> Optional[Dict]:
+        """Claims токена или None, если токен недействителен или отозван"""
+        key = hashlib.sha256(token.encode()).digest()
+        now = time.time()
+        payload = None
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                expires_at, payload = cached
+                if expires_at > now:
+                    self._cache.move_to_end(key)
+                else:
+                    del self._cache[key]
+                    payload = None
+        if payload is not None:
+            return None if self._revoked(payload) else payload
+
+        try:
+            payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
+        except JWTError:
+            return None
+        if self._revoked(payload):
+            return None
+
+        expires_at = payload.get("exp")
+        expires_at = float(expires_at) if expires_at is not None else now + self.default_ttl
+        with self._lock:
+            self._cache[key] = (expires_at, payload)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return payload
+
+
+def _denylist_client():
+    if not AUTH_REDIS_URL:
+        return None
+    return redis.Redis.from_url(AUTH_REDIS_URL)
+
+
+denylist = Denylist(_denylist_client())
+verifier = TokenVerifier(SECRET_KEY, ALGORITHM, TOKEN_CACHE_SIZE, denylist=denylist)
+security = HTTPBearer()
+
+
+def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> TokenData:
+    """Пользователь из токена Authorization: Bearer"""
+    payload = verifier.verify(credentials.credentials)
+    if payload is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    username = payload.get("sub")
+    role = payload.get("role")
+    if username is None or role is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid token payload",
+        )
+
+    return TokenData(username=username, role=role)
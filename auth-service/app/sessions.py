@@ -0,0 +1,241 @@
+"""Сессии пользователей и refresh-токены.
+
+При входе создаётся сессия (таблица sessions) и выдаётся пара токенов:
+короткоживущий access-токен (JWT с claim sid) и refresh-токен вида
+"{id сессии}.{секрет}". В базе и в Redis хранится только SHA-256
+секрета. Каждый вызов /refresh заменяет секрет (ротация), поэтому
+повторное предъявление уже использованного refresh-токена означает
+его утечку - сессия отзывается. Использованным считается только
+секрет, который сессия действительно выдавала: хэши последних
+заменённых секретов хранятся вместе с сессией. Любой другой
+несовпадающий секрет просто отклоняется - иначе подбор id сессии
+позволял бы отзывать чужие сессии.
+
+Состояние сессии читается из Redis (hash auth:session:{id} с TTL до
+истечения сессии); база - долговременная копия, из которой состояние
+восстанавливается при промахе. Ротация проверяет в базе, что сессия
+не отозвана и пользователь активен, поэтому деактивированный
+пользователь не продлит сессию по закешированному состоянию.
+Отозванные сессии попадают в список отзыва (security.Denylist) на
+время жизни их access-токенов.
+"""
+import datetime
+import hashlib
+import hmac
+import logging
+import secrets
+import time
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import select, text, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from .models import Session, User
+
+logger = logging.getLogger(__name__)
+
+
+def hash_secret(secret: str) -> str:
+    return hashlib.sha256(secret.encode()).hexdigest()
+
+
+def split_refresh_token(refresh_token: str) -> Optional[Tuple[int, str]]:
+    """(id сессии, секрет) или None для токена неверного формата"""
+    session_id, _, secret = (refresh_token or '').partition('.')
+    if not session_id.isdigit() or not secret:
+        return None
+    return int(session_id), secret
+
+
+class SessionStore:
+    """Хранилище сессий: Redis с TTL и PostgreSQL как долговременная копия"""
+
+    def __init__(self, redis_client, denylist, ttl: int, access_ttl: int,
+                 rotation_grace: int = 30, rotation_history: int = 5, prefix: str = "auth:session"):
+        self.redis = redis_client
+        self.denylist = denylist
+        self.ttl = ttl
+        # Отозванная сессия остаётся в списке отзыва, пока живут её access-токены
+        self.access_ttl = access_ttl
+        # Окно, в которое предыдущий refresh-токен отклоняется без отзыва сессии
+        # (параллельное обновление из нескольких вкладок)
+        self.rotation_grace = rotation_grace
+        # Сколько заменённых секретов распознаётся как повторное предъявление
+        self.rotation_history = rotation_history
+        self.prefix = prefix
+
+    def key(self, session_id: int) -> str:
+        return f"{self.prefix}:{session_id}"
+
+    async def _cache(self, session_id: int, state: Dict[str, str], expires_at: float):
+        ttl = int(expires_at - time.time())
+        if self.redis is None or ttl <= 0:
+            return
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.hset(self.key(session_id), mapping=state)
+                pipe.expire(self.key(session_id), ttl)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Session cache write failed for session {session_id}: {e}")
+
+    async def _drop(self, session_id: int):
+        if self.redis is None:
+            return
+        try:
+            await self.redis.delete(self.key(session_id))
+        except Exception as e:
+            logger.warning(f"Session cache delete failed for session {session_id}: {e}")
+
+    async def _load(self, db: AsyncSession, session_id: int) -> Optional[Dict[str, str]]:
+        """Состояние сессии из Redis, при промахе - из базы"""
+        if self.redis is not None:
+            try:
+                state = await self.redis.hgetall(self.key(session_id))
+                if state:
+                    return state
+            except Exception as e:
+                logger.warning(f"Session cache read failed for session {session_id}: {e}")
+
+        row = await db.execute(
+            select(Session, User).join(User, User.id == Session.user_id).where(
+                Session.id == session_id,
+                Session.revoked_at.is_(None),
+                Session.expires_at > datetime.datetime.now(),
+                User.is_active == True,
+            )
+        )
+        found = row.first()
+        if found is None:
+            return None
+        session, user = found
+        state = {
+            'user_id': str(user.id),
+            'username': user.username,
+            'role': user.role,
+            'token_hash': session.token,
+            'rotated_hashes': session.rotated_tokens or '',
+            'expires_at': str(session.expires_at.timestamp()),
+        }
+        await self._cache(session_id, state, session.expires_at.timestamp())
+        return state
+
+    async def create(self, db: AsyncSession, user: User) -> Tuple[int, str]:
+        """Новая сессия пользователя: (id сессии, refresh-токен)"""
+        secret = secrets.token_urlsafe(32)
+        expires_at = datetime.datetime.now() + datetime.timedelta(seconds=self.ttl)
+        session = Session(user_id=user.id, token=hash_secret(secret), expires_at=expires_at)
+        db.add(session)
+        await db.commit()
+
+        await self._cache(session.id, {
+            'user_id': str(user.id),
+            'username': user.username,
+            'role': user.role,
+            'token_hash': session.token,
+            'rotated_hashes': '',
+            'expires_at': str(expires_at.timestamp()),
+        }, expires_at.timestamp())
+        return session.id, f"{session.id}.{secret}"
+
+    async def rotate(self, db: AsyncSession, refresh_token: str) -> Optional[Tuple[int, Dict[str, str], str]]:
+        """Обмен refresh-токена на новый: (id сессии, состояние, новый refresh-токен) или None"""
+        parsed = split_refresh_token(refresh_token)
+        if parsed is None:
+            return None
+        session_id, secret = parsed
+
+        state = await self._load(db, session_id)
+        if state is None or float(state['expires_at']) <= time.time():
+            return None
+
+        presented = hash_secret(secret)
+        rotated = (state.get('rotated_hashes') or state.get('previous_hash') or '').split()
+        if not hmac.compare_digest(state['token_hash'], presented):
+            issued = [index for index, value in enumerate(rotated) if hmac.compare_digest(value, presented)]
+            if not issued:
+                # Секрет, который сессия не выдавала, - не повод отзывать её
+                return None
+            rotated_at = float(state.get('rotated_at') or 0)
+            if issued[0] == 0 and time.time() - rotated_at < self.rotation_grace:
+                return None
+            logger.warning(f"Refresh token reuse detected for session {session_id}, revoking")
+            await self.revoke(db, session_id)
+            return None
+
+        new_secret = secrets.token_urlsafe(32)
+        new_hash = hash_secret(new_secret)
+        rotated_hashes = ' '.join([presented] + rotated[:self.rotation_history - 1])
+        # Условие на старый хэш - из двух одновременных обновлений побеждает одно.
+        # Отзыв и активность пользователя проверяются по базе, а не по кешу
+        result = await db.execute(
+            update(Session)
+            .where(
+                Session.id == session_id,
+                Session.token == presented,
+                Session.revoked_at.is_(None),
+                Session.user_id.in_(select(User.id).where(User.is_active == True)),
+            )
+            .values(token=new_hash, rotated_tokens=rotated_hashes)
+        )
+        await db.commit()
+        if result.rowcount == 0:
+            # Закешированное состояние устарело - при следующем обращении оно читается из базы
+            await self._drop(session_id)
+            return None
+
+        state = dict(state, token_hash=new_hash, rotated_hashes=rotated_hashes, rotated_at=str(time.time()))
+        await self._cache(session_id, state, float(state['expires_at']))
+        return session_id, state, f"{session_id}.{new_secret}"
+
+    async def verify_refresh_token(self, db: AsyncSession, refresh_token: str) -> Optional[int]:
+        """Id сессии, если refresh-токен действителен (без ротации)"""
+        parsed = split_refresh_token(refresh_token)
+        if parsed is None:
+            return None
+        session_id, secret = parsed
+        state = await self._load(db, session_id)
+        if state is None or not hmac.compare_digest(state['token_hash'], hash_secret(secret)):
+            return None
+        return session_id
+
+    async def revoke(self, db: AsyncSession, session_id: int):
+        """Отзыв сессии: refresh-токен и выданные access-токены перестают действовать"""
+        await db.execute(
+            update(Session)
+            .where(Session.id == session_id, Session.revoked_at.is_(None))
+            .values(revoked_at=datetime.datetime.now())
+        )
+        await db.commit()
+        await self._drop(session_id)
+        try:
+            await run_in_threadpool(self.denylist.add, str(session_id), self.access_ttl)
+        except Exception as e:
+            # Сессия уже отозвана в базе; запись восстановится при старте (prepare_sessions_table)
+            logger.warning(f"Denylist write failed for session {session_id}: {e}")
+
+
+def prepare_sessions_table(engine: Engine, denylist, access_ttl: int):
+    """Миграция таблицы sessions, удаление старых сессий и восстановление списка отзыва"""
+    with engine.begin() as conn:
+        # create_all не изменяет существующие таблицы - колонки, добавленные позже
+        conn.execute(text("ALTER TABLE sessions ADD COLUMN IF NOT EXISTS revoked_at TIMESTAMP"))
+        conn.execute(text("ALTER TABLE sessions ADD COLUMN IF NOT EXISTS rotated_tokens TEXT"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_sessions_revoked_at ON sessions (revoked_at)"))
+        conn.execute(text("DELETE FROM sessions WHERE expires_at < now() - interval '1 day'"))
+        # Список отзыва в Redis мог быть потерян - отзывы из базы восстанавливаются
+        revoked = conn.execute(text(
+            "SELECT id, revoked_at FROM sessions WHERE revoked_at > :since"
+        ), {"since": datetime.datetime.now() - datetime.timedelta(seconds=access_ttl)}).all()
+
+    now = datetime.datetime.now()
+    for session_id, revoked_at in revoked:
+        remaining = access_ttl - (now - revoked_at).total_seconds()
+        if remaining > 0:
+            try:
+                denylist.add(str(session_id), remaining)
+            except Exception as e:
+                logger.warning(f"Failed to restore denylist entry for session {session_id}: {e}")
+                break
@@ -0,0 +1,77 @@
+"""Нагрузочный тест задержки чтения API при росте числа параллельных клиентов.
+
+Каждый клиент в своём потоке последовательно выполняет GET-запросы к
+перечисленным адресам; для каждого уровня параллельности выводятся
+пропускная способность и перцентили задержки. Если обработчики
+блокируют event loop, p99 растёт пропорционально числу клиентов.
+
+Запуск из корня репозитория (сервисы подняты через docker-compose):
+
+    python benchmarks/bench_api_latency.py http://localhost:8001/devices http://localhost:8002/status
+"""
+import argparse
+import statistics
+import threading
+import time
+import urllib.request
+from typing import List
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run_level(urls: List[str], clients: int, duration: float):
+    """Нагрузка заданным числом клиентов: (задержки в секундах, число ошибок)"""
+    latencies: List[float] = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def client(offset: int):
+        local, failed = [], 0
+        position = offset
+        while time.perf_counter() < stop_at:
+            url = urls[position % len(urls)]
+            position += 1
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(url, timeout=30) as response:
+                    response.read()
+            except Exception:
+                failed += 1
+                continue
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client, args=(index,)) for index in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('urls', nargs='+', help='адреса для GET-запросов (по кругу)')
+    parser.add_argument('--concurrency', default='1,4,16,64', help='уровни параллельности через запятую')
+    parser.add_argument('--duration', type=float, default=10.0, help='длительность каждого уровня, с')
+    args = parser.parse_args()
+
+    print(f"{'clients':>8} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50, ms':>9} {'p99, ms':>9} {'mean, ms':>9}")
+    for clients in (int(level) for level in args.concurrency.split(',')):
+        latencies, errors = run_level(args.urls, clients, args.duration)
+        if not latencies:
+            print(f"{clients:>8} {0:>9} {errors:>7} {'-':>8} {'-':>9} {'-':>9} {'-':>9}")
+            continue
+        print(f"{clients:>8} {len(latencies):>9} {errors:>7} {len(latencies) / args.duration:8.0f} "
+              f"{percentile(latencies, 0.5) * 1000:9.1f} {percentile(latencies, 0.99) * 1000:9.1f} "
+              f"{statistics.mean(latencies) * 1000:9.1f}")
+
+
+if __name__ == '__main__':
+    main()
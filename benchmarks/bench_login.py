@@ -0,0 +1,134 @@
+"""Бенчмарк пропускной способности входа в auth-service.
+
+Режим local измеряет проверки пароля bcrypt в секунду через пул
+хэширования auth-service: на одном ядре и на всех ядрах при заданной
+стоимости. Режим http нагружает запущенный сервис параллельными
+POST /login и одновременно замеряет задержку GET /health - если
+хэширование блокирует event loop, задержка /health растёт вместе с
+числом входов.
+
+Запуск из корня репозитория:
+
+    python benchmarks/bench_login.py local --rounds 12
+    python benchmarks/bench_login.py http --url http://localhost:8000 --username admin --password secret
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'auth-service'))
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else float('nan')
+
+
+def bench_local(args):
+    os.environ['BCRYPT_ROUNDS'] = str(args.rounds)
+    cores = os.cpu_count() or 1
+    print(f"{'workers':>8} {'checks':>7} {'seconds':>8} {'checks/s':>9} {'per core':>9}")
+    for workers in sorted({1, cores}):
+        os.environ['BCRYPT_WORKERS'] = str(workers)
+        os.environ['BCRYPT_MAX_PENDING'] = str(args.checks)
+        for module in [name for name in sys.modules if name == 'app.auth']:
+            del sys.modules[module]
+        from app import auth
+
+        hashed = auth.pwd_context.hash('password')
+
+        async def run():
+            await asyncio.gather(*[auth.verify_and_update_password('password', hashed) for _ in range(args.checks)])
+
+        started = time.perf_counter()
+        asyncio.run(run())
+        elapsed = time.perf_counter() - started
+        rate = args.checks / elapsed
+        print(f"{workers:>8} {args.checks:>7} {elapsed:8.2f} {rate:9.1f} {rate / workers:9.1f}")
+
+
+def bench_http(args):
+    body = json.dumps({'username': args.username, 'password': args.password}).encode()
+    stop_at = time.perf_counter() + args.duration
+    logins: List[float] = []
+    health: List[float] = []
+    status_counts = {}
+    lock = threading.Lock()
+
+    def login_client():
+        while time.perf_counter() < stop_at:
+            request = urllib.request.Request(f"{args.url}/login", data=body,
+                                             headers={'Content-Type': 'application/json'})
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=60) as response:
+                    response.read()
+                    code = response.status
+            except urllib.error.HTTPError as e:
+                code = e.code
+            except Exception:
+                code = 'error'
+            with lock:
+                status_counts[code] = status_counts.get(code, 0) + 1
+                if code == 200:
+                    logins.append(time.perf_counter() - started)
+
+    def health_probe():
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(f"{args.url}/health", timeout=60) as response:
+                    response.read()
+            except Exception:
+                continue
+            health.append(time.perf_counter() - started)
+            time.sleep(0.05)
+
+    threads = [threading.Thread(target=login_client) for _ in range(args.concurrency)]
+    threads.append(threading.Thread(target=health_probe))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    rate = len(logins) / args.duration
+    print(f"logins: {len(logins)} ok in {args.duration:.0f}s, {rate:.1f}/s, "
+          f"{rate / args.server_cores:.1f}/s per core (server cores: {args.server_cores})")
+    print(f"responses: {status_counts}")
+    print(f"login latency p50/p99: {percentile(logins, 0.5) * 1000:.0f}/{percentile(logins, 0.99) * 1000:.0f} ms")
+    print(f"/health latency during logins p50/p99: "
+          f"{percentile(health, 0.5) * 1000:.1f}/{percentile(health, 0.99) * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='mode', required=True)
+
+    local = subparsers.add_parser('local', help='пул хэширования auth-service в этом процессе')
+    local.add_argument('--rounds', type=int, default=12, help='стоимость bcrypt')
+    local.add_argument('--checks', type=int, default=64, help='число проверок пароля')
+
+    http = subparsers.add_parser('http', help='нагрузка на запущенный auth-service')
+    http.add_argument('--url', default='http://localhost:8000')
+    http.add_argument('--username', required=True)
+    http.add_argument('--password', required=True)
+    http.add_argument('--concurrency', type=int, default=16)
+    http.add_argument('--duration', type=float, default=20.0)
+    http.add_argument('--server-cores', type=int, default=1, help='число ядер, выделенных сервису')
+
+    args = parser.parse_args()
+    if args.mode == 'local':
+        bench_local(args)
+    else:
+        bench_http(args)
+
+
+if __name__ == '__main__':
+    main()
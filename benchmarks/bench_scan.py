@@ -0,0 +1,114 @@
+"""Бенчмарк сканирования подсети NetworkScanner на имитированной сети.
+
+ICMPPinger сканера заменяется SimulatedNetwork (benchmarks/simulator.py):
+заданная доля адресов отвечает на ping с задержкой latency+jitter,
+ещё часть - только на ARP. Ожидание таймаутов и скорость отправки
+имитируются, разбор результатов, объединение с ARP и определение
+производителя по OUI выполняются настоящим кодом сканера. Для каждого
+режима (ping_sweep, comprehensive_scan, comprehensive_scan_iter,
+probe_hosts) выводятся адреса в секунду, число найденных устройств,
+время до первой части результатов и процессорное время.
+
+--real-icmp включает настоящий ICMPPinger по адресам 127.0.0.0/8
+(нужен raw-сокет или net.ipv4.ping_group_range): так проверяется
+пропускная способность самого пингера без сети.
+
+Запуск из корня репозитория:
+
+    python benchmarks/bench_scan.py --subnet 10.0.0.0/16 --alive 0.2 --arp-only 0.02
+    python benchmarks/bench_scan.py --subnet 127.1.0.0/20 --real-icmp --modes ping_sweep
+"""
+import argparse
+import asyncio
+import ipaddress
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'discovery-service'))
+
+from app.scanner import NetworkScanner  # noqa: E402
+from simulator import SimulatedNetwork  # noqa: E402
+
+MODES = ('ping_sweep', 'comprehensive_scan', 'comprehensive_scan_iter', 'probe_hosts')
+
+
+def make_scanner(network: SimulatedNetwork, real_icmp: bool) -> NetworkScanner:
+    scanner = NetworkScanner()
+    if not real_icmp:
+        scanner.pinger = network
+    # scapy не отправляет ARP в имитированную сеть: ответы берутся из SimulatedNetwork
+    scanner.arp_scan = lambda subnet: [
+        {**entry, 'vendor': scanner.get_vendor(entry['mac'])} for entry in network.arp_entries(subnet)
+    ]
+    return scanner
+
+
+async def run_mode(scanner: NetworkScanner, mode: str, subnet: str, hosts):
+    first = None
+    started = time.perf_counter()
+    if mode == 'ping_sweep':
+        found = len(await scanner.ping_sweep(subnet))
+    elif mode == 'comprehensive_scan':
+        found = len(await scanner.comprehensive_scan(subnet))
+    elif mode == 'comprehensive_scan_iter':
+        found = 0
+        async for devices in scanner.comprehensive_scan_iter(subnet):
+            if first is None:
+                first = time.perf_counter() - started
+            found += len(devices)
+    else:
+        found = len(await scanner.probe_hosts(hosts))
+    return found, first
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--subnet', default='10.0.0.0/18')
+    parser.add_argument('--alive', type=float, default=0.2, help='доля адресов, отвечающих на ping')
+    parser.add_argument('--arp-only', type=float, default=0.02, help='доля адресов, отвечающих только на ARP')
+    parser.add_argument('--latency-ms', type=float, default=1.0)
+    parser.add_argument('--jitter-ms', type=float, default=2.0)
+    parser.add_argument('--loss', type=float, default=0.0)
+    parser.add_argument('--timeout', type=float, default=2.0, help='таймаут ping (как у сканера)')
+    parser.add_argument('--rate', type=int, default=5000, help='скорость отправки ping, пакетов в секунду')
+    parser.add_argument('--probe-hosts', type=int, default=4096,
+                        help='адресов для probe_hosts (первые адреса подсети)')
+    parser.add_argument('--modes', default=','.join(MODES), help='режимы через запятую')
+    parser.add_argument('--real-icmp', action='store_true', help='настоящий ICMPPinger вместо имитации')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    # Сообщение о каждом найденном узле - не предмет измерения
+    logging.getLogger('app.scanner').setLevel(logging.WARNING)
+
+    network_hosts = ipaddress.ip_network(args.subnet, strict=False).num_addresses - 2
+    hosts = []
+    for ip in ipaddress.ip_network(args.subnet, strict=False).hosts():
+        if len(hosts) >= args.probe_hosts:
+            break
+        hosts.append(str(ip))
+
+    network = SimulatedNetwork(args.alive, args.arp_only, args.latency_ms, args.jitter_ms, args.loss,
+                               args.timeout, 1, args.rate, args.seed)
+    print(f"{args.subnet}: {network_hosts} addresses, alive {args.alive:.0%}, arp-only {args.arp_only:.0%}, "
+          f"{'real ICMP' if args.real_icmp else 'simulated ICMP'}")
+    print(f"{'mode':>24} {'addresses':>10} {'found':>8} {'seconds':>8} {'first':>7} {'addr/s':>9} {'cpu':>7}")
+    for mode in args.modes.split(','):
+        if mode not in MODES:
+            parser.error(f"unknown mode {mode}")
+        scanner = make_scanner(network, args.real_icmp)
+        addresses = len(hosts) if mode == 'probe_hosts' else network_hosts
+        started = time.perf_counter()
+        cpu_started = time.process_time()
+        found, first = asyncio.run(run_mode(scanner, mode, args.subnet, hosts))
+        elapsed = time.perf_counter() - started
+        cpu = time.process_time() - cpu_started
+        first_text = f"{first:7.2f}" if first is not None else f"{'-':>7}"
+        print(f"{mode:>24} {addresses:>10} {found:>8} {elapsed:8.2f} {first_text} "
+              f"{addresses / elapsed:9.0f} {cpu:7.2f}")
+
+
+if __name__ == '__main__':
+    main()
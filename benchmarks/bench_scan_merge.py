@@ -0,0 +1,99 @@
+"""Бенчмарк объединения результатов ping и ARP в NetworkScanner.
+
+Сравнивает прежний вложенный цикл (O(n*m)) с объединением через индекс
+по IP на синтетических результатах сканирования подсети /16.
+
+Запуск из корня репозитория:
+
+    python benchmarks/bench_scan_merge.py --hosts 65534
+"""
+import argparse
+import datetime
+import ipaddress
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'discovery-service'))
+
+from app.scanner import merge_scan_results  # noqa: E402
+
+
+def nested_loop_merge(active_ips, arp_devices):
+    """Прежняя реализация: поиск каждого IP перебором списка ARP"""
+    devices = []
+    for ip in active_ips:
+        device_info = {
+            'ip_address': ip,
+            'mac_address': 'Unknown',
+            'vendor': 'Unknown',
+            'hostname': f"device-{ip.replace('.', '-')}",
+            'device_type': 'unknown',
+            'last_seen': datetime.datetime.now()
+        }
+        for arp_device in arp_devices:
+            if arp_device['ip'] == ip:
+                device_info.update({
+                    'mac_address': arp_device['mac'],
+                    'vendor': arp_device['vendor']
+                })
+                break
+        devices.append(device_info)
+    return devices
+
+
+def synthetic_results(hosts: int, ping_ratio: float, arp_ratio: float, seed: int = 42):
+    """Синтетические результаты ping sweep и ARP scan"""
+    rng = random.Random(seed)
+    network = ipaddress.ip_network('10.0.0.0/8')
+    ips = [str(ip) for _, ip in zip(range(hosts), network.hosts())]
+
+    active_ips = [ip for ip in ips if rng.random() < ping_ratio]
+    arp_devices = [
+        {
+            'ip': ip,
+            'mac': ':'.join(f"{rng.randrange(256):02x}" for _ in range(6)),
+            'vendor': 'Unknown',
+        }
+        for ip in ips if rng.random() < arp_ratio
+    ]
+    rng.shuffle(arp_devices)
+    return active_ips, arp_devices
+
+
+def measure(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - started, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hosts', type=int, default=65534, help='размер подсети (число адресов)')
+    parser.add_argument('--ping-ratio', type=float, default=0.6, help='доля узлов, ответивших на ping')
+    parser.add_argument('--arp-ratio', type=float, default=0.7, help='доля узлов, ответивших на ARP')
+    parser.add_argument('--nested-limit', type=int, default=8192,
+                        help='максимальный размер, на котором запускается вложенный цикл')
+    args = parser.parse_args()
+
+    print(f"{'hosts':>8} {'ping':>8} {'arp':>8} {'nested, s':>12} {'indexed, s':>12} {'speedup':>9}")
+    sizes = sorted({size for size in (1024, 4096, args.nested_limit, args.hosts) if size <= args.hosts})
+    for size in sizes:
+        active_ips, arp_devices = synthetic_results(size, args.ping_ratio, args.arp_ratio)
+        indexed_time, merged = measure(merge_scan_results, active_ips, arp_devices)
+
+        if size <= args.nested_limit:
+            nested_time, _ = measure(nested_loop_merge, active_ips, arp_devices)
+            nested = f"{nested_time:12.4f}"
+            speedup = f"{nested_time / indexed_time:8.0f}x"
+        else:
+            nested, speedup = f"{'-':>12}", f"{'-':>9}"
+
+        print(f"{size:>8} {len(active_ips):>8} {len(arp_devices):>8} {nested} {indexed_time:12.4f} {speedup}")
+
+    print(f"indexed merge returned {len(merged)} devices (ping-responsive plus ARP-only)")
+
+
+if __name__ == '__main__':
+    main()
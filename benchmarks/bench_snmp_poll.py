@@ -0,0 +1,118 @@
+"""Бенчмарк SNMP-опроса на ферме имитированных агентов.
+
+Поднимает ферму агентов (benchmarks/simulator.py) на адресах
+127.16.0.0/12 и опрашивает её через SNMPClient так же, как задачи
+monitoring-service: системные метрики, затем обход ifTable/ifXTable.
+Для каждого уровня max_in_flight выводятся устройства в секунду,
+p50/p99 времени опроса устройства и p50/p99 времени ответа на
+отдельный запрос, число устройств без ответа. По результатам
+подбирается SNMP_MAX_IN_FLIGHT и число воркеров.
+
+Запуск из корня репозитория (Linux):
+
+    python benchmarks/bench_snmp_poll.py --agents 5000 --interfaces 24 --latency-ms 5 --loss 0.01 \\
+        --max-in-flight 100,200,500
+"""
+import argparse
+import os
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'monitoring-service'))
+
+from app.snmp_client import SNMPClient  # noqa: E402
+from simulator import AgentFarm, percentile  # noqa: E402
+
+
+class PollStats:
+    """Время ответа на запросы (observer SNMPClient) и время опроса устройств"""
+
+    def __init__(self):
+        self.requests: List[float] = []
+        self.failures = 0
+        self.devices: List[float] = []
+
+    def observe(self, device_ip: str, seconds: float, failure):
+        if failure:
+            self.failures += 1
+        else:
+            self.requests.append(seconds)
+
+    def timed(self, poll_fn):
+        async def wrapper(device_ip: str):
+            started = time.perf_counter()
+            try:
+                return await poll_fn(device_ip)
+            finally:
+                self.devices.append(time.perf_counter() - started)
+        return wrapper
+
+
+def run_phase(client: SNMPClient, phase: str, device_ips: List[str]) -> Dict:
+    stats = PollStats()
+    client.observer = stats.observe
+    if phase == 'metrics':
+        client.async_get_device_metrics = stats.timed(SNMPClient.async_get_device_metrics.__get__(client))
+        poll = client.get_devices_metrics
+    else:
+        client.async_get_interface_metrics = stats.timed(SNMPClient.async_get_interface_metrics.__get__(client))
+        poll = client.get_devices_interfaces
+
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    results = poll(device_ips)
+    elapsed = time.perf_counter() - started
+    return {
+        'phase': phase,
+        'seconds': elapsed,
+        'cpu': time.process_time() - cpu_started,
+        'devices_per_second': len(device_ips) / elapsed,
+        'device_p50': percentile(stats.devices, 0.5),
+        'device_p99': percentile(stats.devices, 0.99),
+        'request_p50': percentile(stats.requests, 0.5),
+        'request_p99': percentile(stats.requests, 0.99),
+        'requests': len(stats.requests) + stats.failures,
+        'failed_requests': stats.failures,
+        'empty': sum(1 for value in results.values() if not value),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--agents', type=int, default=2000, help='число агентов')
+    parser.add_argument('--interfaces', type=int, default=24, help='интерфейсов на агента')
+    parser.add_argument('--latency-ms', type=float, default=2.0, help='задержка ответа агента')
+    parser.add_argument('--jitter-ms', type=float, default=2.0, help='случайная добавка к задержке')
+    parser.add_argument('--loss', type=float, default=0.0, help='доля запросов без ответа')
+    parser.add_argument('--max-in-flight', default='200', help='уровни SNMP_MAX_IN_FLIGHT через запятую')
+    parser.add_argument('--timeout', type=float, default=2.0, help='таймаут запроса SNMPClient')
+    parser.add_argument('--retries', type=int, default=1)
+    parser.add_argument('--port', type=int, default=16100)
+    parser.add_argument('--farm-workers', type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help='процессов фермы агентов')
+    parser.add_argument('--skip-interfaces', action='store_true', help='только системные метрики')
+    args = parser.parse_args()
+
+    farm = AgentFarm(args.agents, args.port, args.interfaces, latency_ms=args.latency_ms,
+                     jitter_ms=args.jitter_ms, loss=args.loss, workers=args.farm_workers)
+    phases = ('metrics',) if args.skip_interfaces else ('metrics', 'interfaces')
+    print(f"{args.agents} agents, {args.interfaces} interfaces, latency {args.latency_ms}+{args.jitter_ms} ms, "
+          f"loss {args.loss:.1%}, {args.farm_workers} farm workers")
+    print(f"{'in_flight':>9} {'phase':>10} {'seconds':>8} {'cpu':>7} {'dev/s':>8} {'dev_p50':>8} {'dev_p99':>8} "
+          f"{'req_p50':>8} {'req_p99':>8} {'requests':>9} {'failed':>7} {'empty':>6}")
+    with farm:
+        for level in (int(value) for value in args.max_in_flight.split(',')):
+            client = SNMPClient(timeout=args.timeout, retries=args.retries, max_in_flight=level, port=args.port)
+            # Первый обход интерфейсов только запоминает счётчики - как первый опрос в сервисе
+            for phase in phases:
+                row = run_phase(client, phase, farm.addresses)
+                print(f"{level:>9} {row['phase']:>10} {row['seconds']:8.2f} {row['cpu']:7.2f} "
+                      f"{row['devices_per_second']:8.0f} {row['device_p50'] * 1000:7.1f}m "
+                      f"{row['device_p99'] * 1000:7.1f}m {row['request_p50'] * 1000:7.1f}m "
+                      f"{row['request_p99'] * 1000:7.1f}m {row['requests']:>9} {row['failed_requests']:>7} "
+                      f"{row['empty']:>6}")
+
+
+if __name__ == '__main__':
+    main()
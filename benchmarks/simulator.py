@@ -0,0 +1,470 @@
+"""Имитация сети для нагрузочных тестов опроса и обнаружения.
+
+* AgentFarm - тысячи SNMPv2c-агентов на адресах 127.x.y.z: вся сеть
+  127.0.0.0/8 в Linux - loopback, поэтому агенту не нужен отдельный
+  интерфейс. Агенты обслуживаются одним UDP-сокетом на процесс: адрес
+  назначения запроса (номер агента) берётся из IP_PKTINFO, ответ
+  уходит с того же адреса. Процессы делят порт через SO_REUSEPORT.
+  Настраиваются задержка ответа, доля потерянных запросов, число
+  интерфейсов и записей ARP-кеша. Агент отвечает на GET, GETNEXT и
+  GETBULK; значения (sysUpTime, CPU, память, счётчики ifTable/ifXTable)
+  вычисляются из номера агента и времени, поэтому счётчики растут
+  между опросами и MIB не хранится для каждого агента.
+* SimulatedNetwork - ICMP/ARP-ответчик для NetworkScanner: заменяет
+  ping_many пингера и ARP-сканирование, не требует привилегий и сети.
+  Доступность адресов детерминирована (хеш адреса и seed).
+
+Ферма для ручных нагрузочных тестов (monitoring-service с SNMP_PORT=16100):
+
+    python benchmarks/simulator.py --agents 5000 --port 16100 --latency-ms 5 --loss 0.01
+"""
+import argparse
+import asyncio
+import bisect
+import ipaddress
+import math
+import multiprocessing
+import os
+import random
+import socket
+import struct
+import time
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# IP_PKTINFO (Linux) нет в модуле socket
+IP_PKTINFO = getattr(socket, 'IP_PKTINFO', 8)
+
+FARM_BASE = ipaddress.ip_address('127.16.0.1')
+
+# Типы BER, которые использует агент
+INTEGER, OCTET_STRING, NULL, OBJECT_ID, SEQUENCE = 0x02, 0x04, 0x05, 0x06, 0x30
+COUNTER32, GAUGE32, TIME_TICKS, COUNTER64 = 0x41, 0x42, 0x43, 0x46
+NO_SUCH_OBJECT, END_OF_MIB_VIEW = 0x80, 0x82
+GET, GET_NEXT, RESPONSE, GET_BULK = 0xA0, 0xA1, 0xA2, 0xA5
+
+# Распространённые OUI, чтобы определение производителя шло по базе
+_OUIS = ('00:1b:54', '00:50:56', '3c:52:82', 'f4:cf:e2', '00:0c:29', 'b8:27:eb')
+
+
+def agent_address(index: int) -> str:
+    return str(FARM_BASE + index)
+
+
+def agent_index(address: str) -> int:
+    return int(ipaddress.ip_address(address)) - int(FARM_BASE)
+
+
+def synthetic_mac(address: str, seed: int = 0) -> str:
+    digest = zlib.crc32(f"{seed}:{address}".encode())
+    tail = ':'.join(f"{(digest >> shift) & 0xFF:02x}" for shift in (16, 8, 0))
+    return f"{_OUIS[digest % len(_OUIS)]}:{tail}"
+
+
+# --- BER ---
+
+def _length(length: int) -> bytes:
+    if length < 0x80:
+        return bytes([length])
+    raw = length.to_bytes((length.bit_length() + 7) // 8, 'big')
+    return bytes([0x80 | len(raw)]) + raw
+
+
+def _tlv(tag: int, payload: bytes) -> bytes:
+    return bytes([tag]) + _length(len(payload)) + payload
+
+
+def _integer(tag: int, value: int) -> bytes:
+    return _tlv(tag, value.to_bytes(value.bit_length() // 8 + 1, 'big', signed=value < 0))
+
+
+def _oid(oid: Tuple[int, ...]) -> bytes:
+    out = bytearray([oid[0] * 40 + oid[1]])
+    for part in oid[2:]:
+        chunk = [part & 0x7F]
+        part >>= 7
+        while part:
+            chunk.append(0x80 | (part & 0x7F))
+            part >>= 7
+        out += bytes(reversed(chunk))
+    return _tlv(OBJECT_ID, bytes(out))
+
+
+def _read(buffer: bytes, offset: int) -> Tuple[int, bytes, int]:
+    """(тег, содержимое, смещение следующего элемента)"""
+    tag, length = buffer[offset], buffer[offset + 1]
+    offset += 2
+    if length & 0x80:
+        size = length & 0x7F
+        length = int.from_bytes(buffer[offset:offset + size], 'big')
+        offset += size
+    return tag, buffer[offset:offset + length], offset + length
+
+
+def _decode_oid(raw: bytes) -> Tuple[int, ...]:
+    oid = [raw[0] // 40, raw[0] % 40]
+    value = 0
+    for byte in raw[1:]:
+        value = (value << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            oid.append(value)
+            value = 0
+    return tuple(oid)
+
+
+def _encode_value(tag: int, value) -> bytes:
+    if tag == OCTET_STRING:
+        return _tlv(OCTET_STRING, value if isinstance(value, bytes) else value.encode())
+    if tag in (NULL, NO_SUCH_OBJECT, END_OF_MIB_VIEW):
+        return _tlv(tag, b'')
+    return _integer(tag, value)
+
+
+# --- MIB ---
+
+class MibTemplate:
+    """Общая для всех агентов структура MIB: отсортированные OID и способ вычисления значения"""
+
+    def __init__(self, interfaces: int, arp_entries: int):
+        entries = [
+            ((1, 3, 6, 1, 2, 1, 1, 1, 0), 'sys_descr', 0),
+            ((1, 3, 6, 1, 2, 1, 1, 3, 0), 'sys_uptime', 0),
+            ((1, 3, 6, 1, 2, 1, 1, 5, 0), 'sys_name', 0),
+            ((1, 3, 6, 1, 4, 1, 9, 2, 1, 56, 0), 'cpu', 0),
+            ((1, 3, 6, 1, 4, 1, 9, 9, 48, 1, 1, 1, 5, 1), 'memory_used', 0),
+            ((1, 3, 6, 1, 4, 1, 9, 9, 48, 1, 1, 1, 6, 1), 'memory_free', 0),
+        ]
+        if_columns = {2: 'if_descr', 7: 'if_admin', 8: 'if_oper', 10: 'if_in_octets', 14: 'if_in_errors',
+                      16: 'if_out_octets'}
+        for column, kind in if_columns.items():
+            entries.extend(((1, 3, 6, 1, 2, 1, 2, 2, 1, column, port), kind, port)
+                           for port in range(1, interfaces + 1))
+        for column, kind in ((6, 'if_hc_in_octets'), (10, 'if_hc_out_octets')):
+            entries.extend(((1, 3, 6, 1, 2, 1, 31, 1, 1, 1, column, port), kind, port)
+                           for port in range(1, interfaces + 1))
+        neighbours = [tuple(int(part) for part in str(ipaddress.ip_address('10.0.0.0') + n + 1).split('.'))
+                      for n in range(arp_entries)]
+        for column, kind in ((2, 'arp_mac'), (4, 'arp_type')):
+            entries.extend(((1, 3, 6, 1, 2, 1, 4, 22, 1, column, 1) + neighbour, kind, neighbour)
+                           for neighbour in neighbours)
+        entries.sort()
+        self.oids = [oid for oid, _, _ in entries]
+        self.entries = entries
+        self.by_oid = {oid: (kind, arg) for oid, kind, arg in entries}
+
+    def next_entry(self, oid: Tuple[int, ...]) -> Optional[Tuple[Tuple[int, ...], str, object]]:
+        position = bisect.bisect_right(self.oids, oid)
+        return self.entries[position] if position < len(self.entries) else None
+
+
+def mib_value(kind: str, arg, agent: int, now: float, started: float) -> Tuple[int, object]:
+    """(тег, значение) переменной агента в момент now"""
+    elapsed = now - started
+    if kind == 'sys_descr':
+        return OCTET_STRING, f"Simulated agent {agent}"
+    if kind == 'sys_name':
+        return OCTET_STRING, f"sim-{agent}"
+    if kind == 'sys_uptime':
+        return TIME_TICKS, int((elapsed + agent % 1000 * 3600) * 100) & 0xFFFFFFFF
+    if kind == 'cpu':
+        return GAUGE32, int(30 + 25 * math.sin(now / 300 + agent))
+    if kind == 'memory_used':
+        return GAUGE32, 400000 + agent % 97 * 1000
+    if kind == 'memory_free':
+        return GAUGE32, 600000 - agent % 97 * 1000
+    if kind == 'if_descr':
+        return OCTET_STRING, f"GigabitEthernet0/{arg}"
+    if kind == 'if_admin':
+        return INTEGER, 1
+    if kind == 'if_oper':
+        return INTEGER, 2 if (agent + arg) % 7 == 0 else 1
+    if kind == 'arp_mac':
+        return OCTET_STRING, bytes.fromhex(synthetic_mac('.'.join(map(str, arg)), agent).replace(':', ''))
+    if kind == 'arp_type':
+        return INTEGER, 3
+    # Скорость интерфейса - от 1 до 100 Мбит/с, ошибок - единицы в минуту
+    rate = ((agent * 31 + arg * 17) % 100 + 1) * 125000
+    if kind == 'if_in_octets':
+        return COUNTER32, int(rate * elapsed) & 0xFFFFFFFF
+    if kind == 'if_out_octets':
+        return COUNTER32, int(rate * elapsed / 2) & 0xFFFFFFFF
+    if kind == 'if_hc_in_octets':
+        return COUNTER64, int(rate * elapsed)
+    if kind == 'if_hc_out_octets':
+        return COUNTER64, int(rate * elapsed / 2)
+    if kind == 'if_in_errors':
+        return COUNTER32, int(elapsed / 20 * ((agent + arg) % 3))
+    return NO_SUCH_OBJECT, None
+
+
+class AgentResponder:
+    """Разбор запроса SNMPv2c и сборка ответа агента"""
+
+    def __init__(self, template: MibTemplate, community: bytes = b'public'):
+        self.template = template
+        self.community = community
+        self.started = time.time()
+
+    def _get(self, agent: int, oid, now: float):
+        kind, arg = self.template.by_oid.get(oid, ('', None))
+        return (oid,) + (mib_value(kind, arg, agent, now, self.started) if kind else (NO_SUCH_OBJECT, None))
+
+    def _next(self, agent: int, oid, now: float):
+        entry = self.template.next_entry(oid)
+        if entry is None:
+            return oid, END_OF_MIB_VIEW, None
+        next_oid, kind, arg = entry
+        return (next_oid,) + mib_value(kind, arg, agent, now, self.started)
+
+    def respond(self, agent: int, request: bytes) -> Optional[bytes]:
+        try:
+            _, message, _ = _read(request, 0)
+            _, version, offset = _read(message, 0)
+            _, community, offset = _read(message, offset)
+            pdu_type, pdu, _ = _read(message, offset)
+            _, request_id, offset = _read(pdu, 0)
+            _, first, offset = _read(pdu, offset)
+            _, second, offset = _read(pdu, offset)
+            _, bindings, _ = _read(pdu, offset)
+            oids = []
+            offset = 0
+            while offset < len(bindings):
+                _, binding, offset = _read(bindings, offset)
+                oids.append(_decode_oid(_read(binding, 0)[1]))
+        except (IndexError, ValueError):
+            return None
+        if community != self.community:
+            # Как настоящий агент: запрос с чужим community остаётся без ответа
+            return None
+
+        now = time.time()
+        if pdu_type == GET:
+            out = [self._get(agent, oid, now) for oid in oids]
+        elif pdu_type == GET_NEXT:
+            out = [self._next(agent, oid, now) for oid in oids]
+        elif pdu_type == GET_BULK:
+            non_repeaters = int.from_bytes(first, 'big')
+            repetitions = int.from_bytes(second, 'big')
+            out = [self._next(agent, oid, now) for oid in oids[:non_repeaters]]
+            cursors = list(oids[non_repeaters:])
+            for _ in range(repetitions):
+                row = [self._next(agent, oid, now) for oid in cursors]
+                out.extend(row)
+                cursors = [oid for oid, _, _ in row]
+                if all(tag == END_OF_MIB_VIEW for _, tag, _ in row):
+                    break
+        else:
+            return None
+
+        bindings = b''.join(_tlv(SEQUENCE, _oid(oid) + _encode_value(tag, value)) for oid, tag, value in out)
+        response = _tlv(RESPONSE, _tlv(INTEGER, request_id) + _integer(INTEGER, 0) + _integer(INTEGER, 0)
+                        + _tlv(SEQUENCE, bindings))
+        return _tlv(SEQUENCE, _tlv(INTEGER, version) + _tlv(OCTET_STRING, community) + response)
+
+
+# --- Ферма агентов ---
+
+def _serve(port: int, agents: int, interfaces: int, arp_entries: int, latency: float, jitter: float,
+           loss: float, community: str, seed: int, ready):
+    """Процесс фермы: один UDP-сокет обслуживает все адреса агентов"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.setsockopt(socket.IPPROTO_IP, IP_PKTINFO, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    # 0.0.0.0: сокет на 127.0.0.1 не получает пакеты для остальных адресов 127.0.0.0/8
+    sock.bind(('0.0.0.0', port))
+    sock.setblocking(False)
+
+    responder = AgentResponder(MibTemplate(interfaces, arp_entries), community.encode())
+    rng = random.Random(seed + os.getpid())
+    loop = asyncio.new_event_loop()
+    base = int(FARM_BASE)
+    ancillary_size = socket.CMSG_SPACE(12)
+
+    def send(reply: bytes, client, source: bytes):
+        try:
+            sock.sendmsg([reply], [(socket.IPPROTO_IP, IP_PKTINFO, struct.pack('=I4s4s', 0, source, b'\0' * 4))],
+                         0, client)
+        except (BlockingIOError, InterruptedError):
+            pass
+
+    def on_readable():
+        while True:
+            try:
+                data, ancillary, _, client = sock.recvmsg(65535, ancillary_size)
+            except (BlockingIOError, InterruptedError):
+                return
+            destination = next((raw[8:12] for level, kind, raw in ancillary
+                                if level == socket.IPPROTO_IP and kind == IP_PKTINFO), None)
+            if destination is None:
+                continue
+            agent = int.from_bytes(destination, 'big') - base
+            if not 0 <= agent < agents or (loss and rng.random() < loss):
+                continue
+            reply = responder.respond(agent, data)
+            if reply is None:
+                continue
+            delay = latency + (rng.random() * jitter if jitter else 0.0)
+            if delay > 0:
+                loop.call_later(delay, send, reply, client, destination)
+            else:
+                send(reply, client, destination)
+
+    loop.add_reader(sock.fileno(), on_readable)
+    ready.set()
+    try:
+        loop.run_forever()
+    finally:
+        sock.close()
+
+
+class AgentFarm:
+    """Ферма имитированных SNMP-агентов в отдельных процессах"""
+
+    def __init__(self, agents: int, port: int = 16100, interfaces: int = 8, arp_entries: int = 0,
+                 latency_ms: float = 0.0, jitter_ms: float = 0.0, loss: float = 0.0,
+                 community: str = 'public', workers: int = 1, seed: int = 42):
+        self.agents = agents
+        self.port = port
+        self.interfaces = interfaces
+        self.arp_entries = arp_entries
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.loss = loss
+        self.community = community
+        self.workers = workers
+        self.seed = seed
+        self._processes: List[multiprocessing.Process] = []
+
+    @property
+    def addresses(self) -> List[str]:
+        return [agent_address(index) for index in range(self.agents)]
+
+    def start(self):
+        for _ in range(self.workers):
+            ready = multiprocessing.Event()
+            process = multiprocessing.Process(target=_serve, daemon=True, args=(
+                self.port, self.agents, self.interfaces, self.arp_entries, self.latency, self.jitter,
+                self.loss, self.community, self.seed, ready
+            ))
+            process.start()
+            if not ready.wait(10):
+                self.stop()
+                raise RuntimeError("SNMP agent farm failed to start")
+            self._processes.append(process)
+        return self
+
+    def stop(self):
+        for process in self._processes:
+            process.terminate()
+        for process in self._processes:
+            process.join(5)
+        self._processes = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+# --- ICMP/ARP ---
+
+class SimulatedNetwork:
+    """ICMP/ARP-ответчик: какие адреса отвечают и с какой задержкой.
+
+    alive - доля адресов, отвечающих на ping; arp_only - доля адресов,
+    отвечающих только на ARP (узлы за межсетевым экраном). Пинг
+    занимает время отправки со скоростью rate пакетов в секунду плюс
+    самую долгую задержку ответа или полный таймаут с повторами, если
+    кто-то из пакета не ответил - как у ICMPPinger.
+    """
+
+    def __init__(self, alive: float = 0.3, arp_only: float = 0.02, latency_ms: float = 1.0,
+                 jitter_ms: float = 1.0, loss: float = 0.0, timeout: float = 2.0, retries: int = 1,
+                 rate: int = 5000, seed: int = 42, always_alive: Iterable[str] = ()):
+        self.alive = alive
+        self.arp_only = arp_only
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.loss = loss
+        self.timeout = timeout
+        self.retries = retries
+        self.rate = rate
+        self.seed = seed
+        self.always_alive = set(always_alive)
+        self._rng = random.Random(seed)
+
+    def _bucket(self, address: str) -> float:
+        return zlib.crc32(f"{self.seed}:{address}".encode()) % 100000 / 100000
+
+    def answers_ping(self, address: str) -> bool:
+        return address in self.always_alive or self._bucket(address) < self.alive
+
+    def answers_arp(self, address: str) -> bool:
+        return self.answers_ping(address) or self._bucket(address) < self.alive + self.arp_only
+
+    async def ping_many(self, hosts: Iterable[str],
+                        limits: Optional[Dict[str, Tuple[float, int]]] = None) -> Dict[str, Optional[float]]:
+        """Замена ICMPPinger.ping_many"""
+        hosts = list(dict.fromkeys(hosts))
+        results: Dict[str, Optional[float]] = {}
+        wait = len(hosts) / self.rate if self.rate else 0.0
+        slowest = 0.0
+        for host in hosts:
+            timeout, retries = (limits or {}).get(host, (self.timeout, self.retries))
+            if self.answers_ping(host) and not (self.loss and self._rng.random() < self.loss):
+                results[host] = self.latency + self._rng.random() * self.jitter
+                slowest = max(slowest, results[host])
+            else:
+                results[host] = None
+                slowest = max(slowest, timeout * (retries + 1))
+        await asyncio.sleep(wait + slowest)
+        return results
+
+    def arp_entries(self, subnet) -> List[Dict]:
+        """Ответы на ARP (подсеть или список адресов): [{'ip': ..., 'mac': ...}]"""
+        if isinstance(subnet, str):
+            addresses = (str(ip) for ip in ipaddress.ip_network(subnet, strict=False).hosts())
+        else:
+            addresses = subnet
+        # Как srp с timeout=1: ответы собираются секунду
+        time.sleep(1.0)
+        return [{'ip': address, 'mac': synthetic_mac(address, self.seed)}
+                for address in addresses if self.answers_arp(address)]
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--agents', type=int, default=1000, help='число агентов (адреса с 127.16.0.1)')
+    parser.add_argument('--port', type=int, default=16100)
+    parser.add_argument('--interfaces', type=int, default=8, help='интерфейсов на агента')
+    parser.add_argument('--arp-entries', type=int, default=0, help='записей ARP-кеша на агента')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='задержка ответа')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='случайная добавка к задержке')
+    parser.add_argument('--loss', type=float, default=0.0, help='доля запросов без ответа')
+    parser.add_argument('--community', default='public')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='процессов фермы')
+    args = parser.parse_args()
+
+    farm = AgentFarm(args.agents, args.port, args.interfaces, args.arp_entries, args.latency_ms,
+                     args.jitter_ms, args.loss, args.community, args.workers)
+    with farm:
+        print(f"{args.agents} agents on {agent_address(0)}-{agent_address(args.agents - 1)}:{args.port}, "
+              f"{args.workers} workers; Ctrl+C to stop")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""Инкрементальное обнаружение: события изменений и расписание sweep-ов.
+
+Вместо полного сканирования подсетей каждые несколько минут
+инвентарь поддерживается тремя источниками:
+
+* проверка известных активных устройств одним ICMP-запросом (и ARP
+  для не ответивших);
+* sweep адресов, не известных как активные, - редко и по шардам:
+  каждый шард подсети сканируется раз в interval секунд, за один тик
+  берётся ограниченное число шардов (SweepPlanner);
+* ARP-таблицы маршрутизаторов (ipNetToMediaTable), которые
+  monitoring-service снимает при SNMP-опросе.
+
+Сравнение наблюдения с записью инвентаря порождает события: new -
+новое устройство, mac_changed - на адресе другой MAC, returned -
+неактивное устройство снова отвечает, gone - устройство не отвечает
+заданное число проверок подряд.
+"""
+import ipaddress
+import json
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+EVENT_NEW = "new"
+EVENT_MAC_CHANGED = "mac_changed"
+EVENT_RETURNED = "returned"
+EVENT_GONE = "gone"
+
+
+def normalize_mac(mac_address: Optional[str]) -> Optional[str]:
+    """MAC в виде aa:bb:cc:dd:ee:ff или None для неизвестного"""
+    if not mac_address or mac_address == 'Unknown':
+        return None
+    digits = ''.join(ch for ch in mac_address.lower() if ch in '0123456789abcdef')
+    if len(digits) != 12:
+        return None
+    return ':'.join(digits[i:i + 2] for i in range(0, 12, 2))
+
+
+def detect_changes(existing: Dict[str, Tuple[Optional[str], bool]], devices: Iterable[Dict],
+                   source: str) -> List[Dict]:
+    """События по наблюдениям devices относительно инвентаря existing ({IP: (MAC, активно)})"""
+    events = []
+    for device in devices:
+        ip = device['ip_address']
+        mac = normalize_mac(device.get('mac_address'))
+        if ip not in existing:
+            events.append({'device_ip': ip, 'event_type': EVENT_NEW, 'mac_address': mac,
+                           'previous_mac': None, 'source': source})
+            continue
+
+        known_mac, is_active = existing[ip]
+        known_mac = normalize_mac(known_mac)
+        if mac and known_mac and mac != known_mac:
+            events.append({'device_ip': ip, 'event_type': EVENT_MAC_CHANGED, 'mac_address': mac,
+                           'previous_mac': known_mac, 'source': source})
+        elif not is_active:
+            events.append({'device_ip': ip, 'event_type': EVENT_RETURNED, 'mac_address': mac or known_mac,
+                           'previous_mac': None, 'source': source})
+    return events
+
+
+def within(ip: str, networks: List[ipaddress.IPv4Network]) -> bool:
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    return any(address in network for network in networks)
+
+
+class SweepPlanner:
+    """Расписание sweep-ов шардов подсетей.
+
+    Время последнего sweep-а каждого шарда хранится в Redis (hash).
+    Шард выдаётся не чаще раза в interval секунд и помечается сразу
+    при выдаче, поэтому параллельные тики не сканируют его повторно.
+    """
+
+    def __init__(self, redis_client, interval: float, shard_prefix: int = 24,
+                 key: str = "discovery:sweep:last"):
+        self.redis = redis_client
+        self.interval = interval
+        self.shard_prefix = shard_prefix
+        self.key = key
+
+    def shards(self, subnets: Iterable[str]) -> List[str]:
+        result = []
+        for subnet in subnets:
+            network = ipaddress.ip_network(subnet, strict=False)
+            if network.prefixlen >= self.shard_prefix:
+                result.append(str(network))
+            else:
+                result.extend(str(shard) for shard in network.subnets(new_prefix=self.shard_prefix))
+        return result
+
+    def take_due(self, subnets: Iterable[str], limit: int, now: Optional[float] = None) -> List[str]:
+        """Шарды, sweep которых просрочен (самые давние первыми), не больше limit"""
+        now = time.time() if now is None else now
+        shards = self.shards(subnets)
+        if not shards:
+            return []
+        # Шарды, которые ещё ни разу не сканировались, идут первыми
+        last = {
+            shard: float(value) if value is not None else float('-inf')
+            for shard, value in zip(shards, self.redis.hmget(self.key, shards))
+        }
+        due = sorted(
+            (swept_at, shard) for shard, swept_at in last.items()
+            if now - swept_at >= self.interval
+        )[:limit]
+        taken = [shard for _, shard in due]
+        if taken:
+            self.redis.hset(self.key, mapping={shard: now for shard in taken})
+        return taken
+
+
+def publish_events(redis_client, events: List[Dict], channel: str = "discovery:events"):
+    """Рассылка событий подписчикам (после записи в базу)"""
+    if not events:
+        return
+    try:
+        redis_client.publish(channel, json.dumps(events, default=str))
+    except Exception as e:
+        logger.warning(f"Failed to publish {len(events)} discovery events: {e}")
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, Index
+from sqlalchemy.dialects.postgresql import INET
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 
@@ -6,16 +7,24 @@ Base = declarative_base()
 
 class NetworkDevice(Base):
     __tablename__ = "network_devices"
+    __table_args__ = (
+        # Containment queries (ip_address <<= subnet) use GiST
+        Index('ix_network_devices_ip_address_gist', 'ip_address',
+              postgresql_using='gist', postgresql_ops={'ip_address': 'inet_ops'}),
+        # Keyset pagination ordered by last_seen
+        Index('ix_network_devices_last_seen_id', 'last_seen', 'id'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    ip_address = Column(String(15), unique=True, index=True, nullable=False)
+    ip_address = Column(INET, unique=True, index=True, nullable=False)
     mac_address = Column(String(17), nullable=True)
     hostname = Column(String(100), nullable=True)
-    vendor = Column(String(100), nullable=True)
-    device_type = Column(String(50), nullable=True)  # router, switch, server, etc.
+    vendor = Column(String(100), nullable=True, index=True)
+    device_type = Column(String(50), nullable=True, index=True)  # router, switch, server, etc.
     os_version = Column(String(100), nullable=True)
     is_active = Column(Boolean, default=True)
-    last_seen = Column(DateTime, default=func.now())
+    missed_scans = Column(Integer, default=0)  # scans in a row that did not see the device
+    last_seen = Column(DateTime, default=func.now(), nullable=False)
     created_at = Column(DateTime, default=func.now())
 
 class NetworkScan(Base):
@@ -26,4 +35,27 @@ class NetworkScan(Base):
     devices_found = Column(Integer, default=0)
     scan_duration = Column(Integer)  # in seconds
     status = Column(String(20), default="completed")  # running, completed, failed
-    created_at = Column(DateTime, default=func.now())
\ No newline at end of file
+    created_at = Column(DateTime, default=func.now())
+
+class ScanShard(Base):
+    __tablename__ = "network_scan_shards"
+
+    id = Column(Integer, primary_key=True, index=True)
+    scan_id = Column(Integer, nullable=False, index=True)
+    subnet = Column(String(18), nullable=False)  # CIDR notation
+    status = Column(String(20), default="pending")  # pending, running, completed, failed
+    devices_found = Column(Integer, default=0)
+    attempts = Column(Integer, default=0)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+class DeviceEvent(Base):
+    __tablename__ = "device_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    device_ip = Column(String(15), nullable=False, index=True)
+    event_type = Column(String(20), nullable=False)  # new, mac_changed, returned, gone
+    mac_address = Column(String(17), nullable=True)
+    previous_mac = Column(String(17), nullable=True)
+    source = Column(String(20), nullable=False)  # scan, verify, sweep, snmp-arp
+    created_at = Column(DateTime, default=func.now(), index=True)
@@ -0,0 +1,203 @@
+"""Определение производителя по MAC-адресу на основе реестров IEEE.
+
+Реестры MA-L (24 бита), MA-M (28 бит) и MA-S (36 бит) сворачиваются в
+компактный бинарный индекс: для каждой длины префикса - отсортированный
+массив префиксов uint64 и параллельный массив номеров производителей,
+плюс таблица строк. Индекс отображается в память (mmap) без разбора,
+поиск - двоичный поиск от самого длинного префикса к самому короткому.
+
+В app/data лежит снимок реестров в формате CSV IEEE (oui.csv, mam.csv,
+oui36.csv): из него индекс строится, если свежие реестры скачать
+нельзя. Скачанные реестры в app/data не записываются и снимок не
+заменяют.
+
+Сборка индекса из CSV-файлов IEEE:
+
+    python -m app.oui build app/data/oui.csv app/data/mam.csv app/data/oui36.csv -o app/data/oui.idx
+    python -m app.oui build --download --download-dir /tmp/ieee
+"""
+import argparse
+import bisect
+import csv
+import functools
+import logging
+import mmap
+import os
+import re
+import struct
+import tempfile
+import urllib.request
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+DEFAULT_INDEX_PATH = os.path.join(DATA_DIR, 'oui.idx')
+
+IEEE_REGISTRY_URLS = [
+    'https://standards-oui.ieee.org/oui/oui.csv',
+    'https://standards-oui.ieee.org/oui28/mam.csv',
+    'https://standards-oui.ieee.org/oui36/oui36.csv',
+]
+
+PREFIX_BITS = (36, 28, 24)  # порядок поиска: самый длинный префикс первым
+
+_MAGIC = b'OUIX'
+_VERSION = 1
+_HEADER = struct.Struct('<4sIIIII')  # magic, version, n36, n28, n24, число строк
+_HEX = re.compile(r'[^0-9a-f]')
+
+
+def parse_registry(path: str) -> Iterable[Tuple[int, int, str]]:
+    """Чтение CSV-реестра IEEE: (длина префикса в битах, префикс, производитель)"""
+    with open(path, newline='', encoding='utf-8') as registry:
+        for row in csv.DictReader(registry):
+            assignment = (row.get('Assignment') or '').strip().lower()
+            organization = (row.get('Organization Name') or '').strip()
+            if not assignment or not organization:
+                continue
+            bits = len(assignment) * 4
+            if bits not in PREFIX_BITS:
+                continue
+            yield bits, int(assignment, 16), organization
+
+
+def build_index(records: Iterable[Tuple[int, int, str]]) -> bytes:
+    """Сборка бинарного индекса из записей реестра"""
+    tables: Dict[int, Dict[int, str]] = {bits: {} for bits in PREFIX_BITS}
+    for bits, prefix, organization in records:
+        tables[bits][prefix] = organization
+
+    names: List[str] = []
+    name_ids: Dict[str, int] = {}
+    keys_parts, ids_parts = [], []
+    for bits in PREFIX_BITS:
+        prefixes = sorted(tables[bits])
+        ids = []
+        for prefix in prefixes:
+            organization = tables[bits][prefix]
+            if organization not in name_ids:
+                name_ids[organization] = len(names)
+                names.append(organization)
+            ids.append(name_ids[organization])
+        keys_parts.append(struct.pack(f'<{len(prefixes)}Q', *prefixes))
+        ids_parts.append(struct.pack(f'<{len(ids)}I', *ids))
+
+    blob = bytearray()
+    offsets = [0]
+    for name in names:
+        blob += name.encode('utf-8')
+        offsets.append(len(blob))
+
+    header = _HEADER.pack(_MAGIC, _VERSION, *(len(tables[bits]) for bits in PREFIX_BITS), len(names))
+    return b''.join([header, *keys_parts, *ids_parts, struct.pack(f'<{len(offsets)}I', *offsets), bytes(blob)])
+
+
+class OUIResolver:
+    """Поиск производителя по MAC-адресу (longest-prefix match) с LRU-кешем"""
+
+    def __init__(self, buffer, cache_size: int = 65536):
+        self._buffer = buffer
+        view = memoryview(buffer)
+        magic, version, *counts, name_count = _HEADER.unpack_from(view, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError("Unsupported OUI index format")
+
+        offset = _HEADER.size
+        self._keys = {}
+        for bits, count in zip(PREFIX_BITS, counts):
+            self._keys[bits] = view[offset:offset + count * 8].cast('Q')
+            offset += count * 8
+        self._ids = {}
+        for bits, count in zip(PREFIX_BITS, counts):
+            self._ids[bits] = view[offset:offset + count * 4].cast('I')
+            offset += count * 4
+        self._name_offsets = view[offset:offset + (name_count + 1) * 4].cast('I')
+        offset += (name_count + 1) * 4
+        self._names = view[offset:]
+
+        self._lookup_prefix = functools.lru_cache(maxsize=cache_size)(self._lookup_uncached)
+
+    def __len__(self) -> int:
+        return sum(len(keys) for keys in self._keys.values())
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> 'OUIResolver':
+        """Загрузка готового индекса через mmap"""
+        with open(path, 'rb') as index_file:
+            buffer = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(buffer, **kwargs)
+
+    @classmethod
+    def from_registries(cls, paths: Iterable[str], **kwargs) -> 'OUIResolver':
+        """Сборка индекса в памяти из CSV-реестров"""
+        records = [record for path in paths for record in parse_registry(path)]
+        return cls(build_index(records), **kwargs)
+
+    def _name(self, name_id: int) -> str:
+        start, end = self._name_offsets[name_id], self._name_offsets[name_id + 1]
+        return bytes(self._names[start:end]).decode('utf-8')
+
+    def _lookup_uncached(self, prefix36: int) -> Optional[str]:
+        for bits in PREFIX_BITS:
+            keys = self._keys[bits]
+            key = prefix36 >> (36 - bits)
+            position = bisect.bisect_left(keys, key)
+            if position < len(keys) and keys[position] == key:
+                return self._name(self._ids[bits][position])
+        return None
+
+    def lookup(self, mac_address: str) -> Optional[str]:
+        """Производитель по MAC-адресу или None"""
+        digits = _HEX.sub('', mac_address.lower())
+        if len(digits) < 6:
+            return None
+        return self._lookup_prefix(int(digits[:9].ljust(9, '0'), 16))
+
+
+def load_resolver(index_path: Optional[str] = None) -> OUIResolver:
+    """Загрузка индекса: готовый бинарный файл или CSV-реестры из каталога data"""
+    index_path = index_path or os.getenv("OUI_INDEX_PATH", DEFAULT_INDEX_PATH)
+    if os.path.exists(index_path):
+        return OUIResolver.from_file(index_path)
+
+    registries = sorted(
+        os.path.join(DATA_DIR, name) for name in os.listdir(DATA_DIR) if name.endswith('.csv')
+    ) if os.path.isdir(DATA_DIR) else []
+    logger.warning(f"OUI index {index_path} not found, building from {len(registries)} registry files")
+    return OUIResolver.from_registries(registries)
+
+
+@functools.lru_cache(maxsize=1)
+def get_resolver() -> OUIResolver:
+    """Общий экземпляр индекса на процесс"""
+    return load_resolver()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сборка бинарного индекса OUI из реестров IEEE")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build')
+    build.add_argument('registries', nargs='*', help='CSV-файлы реестров IEEE (MA-L, MA-M, MA-S)')
+    build.add_argument('-o', '--output', default=DEFAULT_INDEX_PATH)
+    build.add_argument('--download', action='store_true', help='скачать актуальные реестры с сайта IEEE')
+    build.add_argument('--download-dir', help='каталог для скачанных реестров (по умолчанию - временный)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temporary:
+        registries = list(args.registries)
+        if args.download:
+            download_dir = args.download_dir or temporary
+            os.makedirs(download_dir, exist_ok=True)
+            for url in IEEE_REGISTRY_URLS:
+                path = os.path.join(download_dir, url.rsplit('/', 1)[-1])
+                urllib.request.urlretrieve(url, path)
+                registries.append(path)
+        records = [record for path in registries for record in parse_registry(path)]
+    with open(args.output, 'wb') as index_file:
+        index_file.write(build_index(records))
+    print(f"OUI index written to {args.output}: {len(records)} assignments")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Keyset-пагинация и условные ответы (ETag) для списков API.
+
+Курсор - непрозрачная строка с ключом сортировки и id последней
+строки страницы. Следующая страница выбирается условием "после
+курсора" по индексу, а не OFFSET, поэтому стоимость запроса не
+растёт с номером страницы.
+
+ETag - хеш тела ответа. Клиент, повторивший запрос с If-None-Match,
+получает 304 без тела, если страница не изменилась.
+"""
+import base64
+import datetime
+import hashlib
+import json
+from typing import Any, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from starlette.responses import Response
+
+CACHE_CONTROL = "private, no-cache"
+
+
+def encode_cursor(value: Any, row_id: int) -> str:
+    if isinstance(value, datetime.datetime):
+        value = value.isoformat()
+    payload = json.dumps([value, row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, int]:
+    """(ключ сортировки, id) из курсора; 400 для повреждённого курсора"""
+    try:
+        value, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return value, int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def json_default(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return str(value)
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Слабое сравнение: прокси со сжатием помечают ETag как W/
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag in candidates
+
+
+def cached_json_response(request: Request, payload: Any, headers: Optional[dict] = None) -> Response:
+    """JSON-ответ с ETag; 304 без тела, если клиент уже получил такую же страницу"""
+    body = json.dumps(payload, default=json_default, separators=(",", ":")).encode()
+    etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    headers = {**(headers or {}), "ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
@@ -1,42 +1,84 @@
 import asyncio
 import ipaddress
-from ping3 import ping
+import itertools
 from scapy.all import ARP, Ether, srp
 import datetime
-from typing import List, Dict
+from typing import AsyncIterator, List, Dict, Optional, Union
 import logging
 
+from .icmp import ICMPPinger
+from .oui import get_resolver
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def make_device_info(ip: str, arp_device: Optional[Dict] = None, last_seen: Optional[datetime.datetime] = None) -> Dict:
+    """Описание найденного устройства"""
+    return {
+        'ip_address': ip,
+        'mac_address': arp_device['mac'] if arp_device else 'Unknown',
+        'vendor': arp_device['vendor'] if arp_device else 'Unknown',
+        'hostname': f"device-{ip.replace('.', '-')}",
+        'device_type': 'unknown',
+        'last_seen': last_seen or datetime.datetime.now()
+    }
+
+def merge_scan_results(active_ips: List[str], arp_devices: List[Dict]) -> List[Dict]:
+    """Объединение результатов ping и ARP через индекс по IP.
+
+    Узлы, ответившие на ARP, но не на ICMP (например, за межсетевым
+    экраном), тоже попадают в результат.
+    """
+    now = datetime.datetime.now()
+    arp_index = {arp_device['ip']: arp_device for arp_device in arp_devices}
+    
+    devices = [make_device_info(ip, arp_index.get(ip), now) for ip in active_ips]
+    
+    active = set(active_ips)
+    devices.extend(
+        make_device_info(ip, arp_device, now)
+        for ip, arp_device in arp_index.items() if ip not in active
+    )
+    return devices
+
 class NetworkScanner:
     def __init__(self):
         self.timeout = 2
         self.thread_count = 50
+        self.pinger = ICMPPinger(timeout=self.timeout, retries=1)
 
-    async def ping_sweep(self, subnet: str) -> List[str]:
-        """Асинхронное сканирование подсети с помощью ping"""
+    async def ping_sweep_iter(self, subnet: str, chunk_size: int = 1024) -> AsyncIterator[List[str]]:
+        """Ping sweep подсети частями: активные адреса отдаются по мере обработки каждой части"""
         network = ipaddress.ip_network(subnet, strict=False)
-        active_ips = []
+        hosts = (str(ip) for ip in network.hosts())
         
-        async def check_ip(ip):
-            try:
-                response = await asyncio.get_event_loop().run_in_executor(
-                    None, ping, str(ip), self.timeout
-                )
-                if response is not None and response is not False:
-                    active_ips.append(str(ip))
+        while True:
+            chunk = list(itertools.islice(hosts, chunk_size))
+            if not chunk:
+                break
+            
+            # Все запросы уходят из одного ICMP-сокета, ответы сопоставляются по id/sequence
+            results = await self.pinger.ping_many(chunk)
+            
+            active_ips = []
+            for ip, response_time in results.items():
+                if response_time is not None:
+                    active_ips.append(ip)
                     logger.info(f"Found active device: {ip}")
-            except Exception as e:
-                logger.debug(f"Ping failed for {ip}: {e}")
-        
-        tasks = [check_ip(ip) for ip in network.hosts()]
-        await asyncio.gather(*tasks, return_exceptions=True)
-        
+            
+            yield active_ips
+
+    async def ping_sweep(self, subnet: str) -> List[str]:
+        """Асинхронное сканирование подсети с помощью ping"""
+        active_ips = []
+        async for chunk in self.ping_sweep_iter(subnet):
+            active_ips.extend(chunk)
         return active_ips
 
-    def arp_scan(self, subnet: str) -> List[Dict]:
-        """Сканирование ARP для получения MAC-адресов"""
+    def arp_scan(self, subnet: Union[str, List[str]]) -> List[Dict]:
+        """Сканирование ARP для получения MAC-адресов (подсеть или список адресов)"""
+        if not subnet:
+            return []
         try:
             arp_request = ARP(pdst=subnet)
             broadcast = Ether(dst="ff:ff:ff:ff:ff:ff")
@@ -58,54 +100,81 @@ class NetworkScanner:
             return []
 
     def get_vendor(self, mac_address: str) -> str:
-        """Определение производителя по MAC-адресу (упрощенная версия)"""
-        # В реальной системе можно использовать базу данных OUI
-        vendors = {
-            '00:00:0c': 'Cisco',
-            '00:50:56': 'VMware',
-            '00:1c:42': 'Parallels',
-            '00:15:5d': 'Microsoft',
-            '00:0c:29': 'VMware',
-            '00:50:8b': 'Intel',
-            '00:1b:21': 'Hewlett Packard',
-        }
+        """Определение производителя по MAC-адресу (база OUI IEEE)"""
+        return get_resolver().lookup(mac_address) or 'Unknown'
+
+    async def probe_hosts(self, hosts: List[str], chunk_size: int = 1024) -> List[Dict]:
+        """Проверка перечисленных адресов: ping, затем ARP для не ответивших.
+
+        В отличие от sweep-а подсети запросы уходят только на заданные
+        адреса; возвращаются описания ответивших устройств.
+        """
+        devices = []
+        silent = []
+        for start in range(0, len(hosts), chunk_size):
+            results = await self.pinger.ping_many(hosts[start:start + chunk_size])
+            now = datetime.datetime.now()
+            for ip, response_time in results.items():
+                if response_time is None:
+                    silent.append(ip)
+                else:
+                    devices.append(make_device_info(ip, None, now))
+        
+        # Узлы за межсетевым экраном отвечают только на ARP (в пределах L2-сегмента)
+        if silent:
+            loop = asyncio.get_event_loop()
+            arp_devices = await loop.run_in_executor(None, self.arp_scan, silent)
+            now = datetime.datetime.now()
+            devices.extend(make_device_info(arp_device['ip'], arp_device, now) for arp_device in arp_devices)
+        return devices
+
+    async def comprehensive_scan_iter(self, subnet: str) -> AsyncIterator[List[Dict]]:
+        """Комплексное сканирование сети с выдачей найденных устройств частями"""
+        logger.info(f"Starting comprehensive scan for subnet: {subnet}")
+        
+        # ARP scan (блокирующий scapy) идёт в пуле потоков параллельно с ping sweep
+        loop = asyncio.get_event_loop()
+        arp_future = loop.run_in_executor(None, self.arp_scan, subnet)
         
-        mac_prefix = mac_address.lower()[:8]
-        return vendors.get(mac_prefix, 'Unknown')
+        arp_index = None
+        seen = set()
+        async for active_ips in self.ping_sweep_iter(subnet):
+            if arp_index is None:
+                arp_index = {arp_device['ip']: arp_device for arp_device in await arp_future}
+            
+            seen.update(active_ips)
+            now = datetime.datetime.now()
+            devices = [make_device_info(ip, arp_index.get(ip), now) for ip in active_ips]
+            if devices:
+                yield devices
+        
+        if arp_index is None:
+            arp_index = {arp_device['ip']: arp_device for arp_device in await arp_future}
+        
+        # Узлы, ответившие только на ARP
+        now = datetime.datetime.now()
+        arp_only = [
+            make_device_info(ip, arp_device, now)
+            for ip, arp_device in arp_index.items() if ip not in seen
+        ]
+        if arp_only:
+            yield arp_only
+        
+        logger.info(f"Scan completed. Total devices found: {len(seen) + len(arp_only)}")
 
     async def comprehensive_scan(self, subnet: str) -> List[Dict]:
         """Комплексное сканирование сети"""
         logger.info(f"Starting comprehensive scan for subnet: {subnet}")
         
-        # Ping sweep для обнаружения активных устройств
-        active_ips = await self.ping_sweep(subnet)
-        logger.info(f"Ping sweep found {len(active_ips)} active devices")
+        # Ping sweep и ARP scan выполняются одновременно
+        loop = asyncio.get_event_loop()
+        active_ips, arp_devices = await asyncio.gather(
+            self.ping_sweep(subnet),
+            loop.run_in_executor(None, self.arp_scan, subnet)
+        )
+        logger.info(f"Ping sweep found {len(active_ips)} active devices, ARP scan found {len(arp_devices)}")
         
-        # ARP scan для получения MAC-адресов
-        arp_devices = self.arp_scan(subnet)
-        
-        # Объединение результатов
-        devices = []
-        for ip in active_ips:
-            device_info = {
-                'ip_address': ip,
-                'mac_address': 'Unknown',
-                'vendor': 'Unknown',
-                'hostname': f"device-{ip.replace('.', '-')}",
-                'device_type': 'unknown',
-                'last_seen': datetime.datetime.now()
-            }
-            
-            # Поиск в ARP результатах
-            for arp_device in arp_devices:
-                if arp_device['ip'] == ip:
-                    device_info.update({
-                        'mac_address': arp_device['mac'],
-                        'vendor': arp_device['vendor']
-                    })
-                    break
-            
-            devices.append(device_info)
+        devices = merge_scan_results(active_ips, arp_devices)
         
         logger.info(f"Scan completed. Total devices found: {len(devices)}")
-        return devices
\ No newline at end of file
+        return devices
@@ -1,6 +1,14 @@
+const DEVICES_PAGE_SIZE = 200;
+
 const state = {
   token: localStorage.getItem("authToken"),
+  refreshToken: localStorage.getItem("refreshToken"),
+  refreshing: null,
   selectedDevice: null,
+  selectedAvailability: null,
+  devicesCursor: null,
+  liveStatus: new Map(),
+  statusStream: null,
 };
 
 const elements = {
@@ -10,6 +18,7 @@ const elements = {
   authStatus: document.getElementById("auth-status"),
   refreshDevices: document.getElementById("refresh-devices"),
   devicesTableBody: document.getElementById("devices-table-body"),
+  devicesMore: document.getElementById("devices-more"),
   createDeviceForm: document.getElementById("create-device-form"),
   createDeviceStatus: document.getElementById("create-device-status"),
   deviceDetailsCard: document.getElementById("device-details"),
@@ -40,7 +49,54 @@ function setStatus(element, message, type = "") {
   element.className = type ? `status-text ${type}` : "status-text";
 }
 
-async function apiRequest(path, options = {}) {
+function storeSession(tokens) {
+  state.token = tokens?.access_token || null;
+  state.refreshToken = tokens?.refresh_token || null;
+  if (state.token) {
+    localStorage.setItem("authToken", state.token);
+    localStorage.setItem("refreshToken", state.refreshToken);
+  } else {
+    localStorage.removeItem("authToken");
+    localStorage.removeItem("refreshToken");
+  }
+}
+
+// Обмен refresh-токена на новую пару. Параллельные запросы с истёкшим
+// токеном ждут одного обновления: повторно предъявленный refresh-токен
+// сервер считает украденным и отзывает сессию.
+function refreshSession() {
+  if (!state.refreshing) {
+    // Другая вкладка могла уже обновить токены
+    const refreshToken = localStorage.getItem("refreshToken") || state.refreshToken;
+    state.refreshing = fetch("/api/auth/refresh", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ refresh_token: refreshToken }),
+    })
+      .then(async (response) => {
+        if (response.ok) {
+          storeSession(await response.json());
+          return true;
+        }
+        if (localStorage.getItem("refreshToken") !== refreshToken) {
+          // Токены уже обновлены в другой вкладке
+          state.token = localStorage.getItem("authToken");
+          state.refreshToken = localStorage.getItem("refreshToken");
+          return Boolean(state.token);
+        }
+        storeSession(null);
+        updateAuthUI();
+        return false;
+      })
+      .catch(() => false)
+      .finally(() => {
+        state.refreshing = null;
+      });
+  }
+  return state.refreshing;
+}
+
+async function apiRequest(path, options = {}, retried = false) {
   const config = { ...options };
   config.headers = new Headers(options.headers || {});
 
@@ -68,6 +124,12 @@ async function apiRequest(path, options = {}) {
       }
     }
 
+    if (response.status === 401 && !retried && state.refreshToken && !path.startsWith("/api/auth/")) {
+      if (await refreshSession()) {
+        return apiRequest(path, options, true);
+      }
+    }
+
     if (!response.ok) {
       const errorMessage = typeof data === "string" ? data : data?.detail || "Ошибка подключения";
       const error = new Error(errorMessage);
@@ -85,10 +147,12 @@ async function apiRequest(path, options = {}) {
   }
 }
 
-function renderDevices(devices) {
-  elements.devicesTableBody.innerHTML = "";
+function renderDevices(devices, append = false) {
+  if (!append) {
+    elements.devicesTableBody.innerHTML = "";
+  }
 
-  if (!Array.isArray(devices) || devices.length === 0) {
+  if (!append && (!Array.isArray(devices) || devices.length === 0)) {
     elements.devicesTableBody.innerHTML = `
       <tr>
         <td colspan="5" class="empty">Устройства не найдены.</td>
@@ -109,11 +173,17 @@ function renderDevices(devices) {
   });
 }
 
-async function loadDevices() {
+async function loadDevices(append = false) {
   setStatus(elements.createDeviceStatus, "", "");
+  const params = new URLSearchParams({ limit: DEVICES_PAGE_SIZE });
+  if (append && state.devicesCursor) {
+    params.set("cursor", state.devicesCursor);
+  }
   try {
-    const devices = await apiRequest("/api/discovery/devices");
-    renderDevices(devices);
+    const page = await apiRequest(`/api/discovery/devices?${params}`);
+    state.devicesCursor = page.next_cursor;
+    elements.devicesMore.hidden = !page.next_cursor;
+    renderDevices(page.items, append);
   } catch (error) {
     console.error("Не удалось получить список устройств", error);
     elements.devicesTableBody.innerHTML = `
@@ -123,6 +193,20 @@ async function loadDevices() {
   }
 }
 
+function formatDuration(seconds) {
+  const minutes = Math.floor(seconds / 60);
+  const days = Math.floor(minutes / 1440);
+  const hours = Math.floor((minutes % 1440) / 60);
+  if (days > 0) {
+    return `${days} д ${hours} ч`;
+  }
+  return hours > 0 ? `${hours} ч ${minutes % 60} мин` : `${minutes} мин`;
+}
+
+function formatAvailability(report) {
+  return report?.availability != null ? `${report.availability.toFixed(3)} %` : "—";
+}
+
 function renderStatus(status) {
   elements.statusDetails.innerHTML = "";
   if (!status) {
@@ -135,7 +219,10 @@ function renderStatus(status) {
     ["Онлайн", status.is_online ? "Да" : "Нет"],
     ["Время отклика", status.response_time ? `${status.response_time.toFixed(2)} мс` : "—"],
     ["Последняя проверка", status.last_check ? new Date(status.last_check).toLocaleString() : "—"],
-    ["Uptime", status.uptime ? `${Math.round(status.uptime / 60)} мин` : "—"],
+    ["Uptime", status.uptime ? formatDuration(status.uptime) : "—"],
+    ["Доступность (сутки)", formatAvailability(state.selectedAvailability?.periods?.day)],
+    ["Доступность (неделя)", formatAvailability(state.selectedAvailability?.periods?.week)],
+    ["Доступность (месяц)", formatAvailability(state.selectedAvailability?.periods?.month)],
   ];
 
   items.forEach(([term, value]) => {
@@ -191,7 +278,7 @@ async function loadDeviceDetails(ip) {
   elements.detailsStatus.className = "status-text";
 
   try {
-    const [status, metrics, interfaces] = await Promise.all([
+    const [status, metrics, interfaces, availability] = await Promise.all([
       apiRequest(`/api/monitoring/devices/${encodeURIComponent(ip)}/status`).catch((err) => {
         if (err.status === 404) {
           return null;
@@ -210,8 +297,15 @@ async function loadDeviceDetails(ip) {
         }
         throw err;
       }),
+      apiRequest(`/api/monitoring/devices/${encodeURIComponent(ip)}/availability`).catch((err) => {
+        if (err.status === 404) {
+          return null;
+        }
+        throw err;
+      }),
     ]);
 
+    state.selectedAvailability = availability;
     renderStatus(status);
     renderMetrics(metrics);
     renderInterfaces(interfaces);
@@ -222,8 +316,36 @@ async function loadDeviceDetails(ip) {
   }
 }
 
+function applyLiveUpdates(updates) {
+  updates.forEach((update) => {
+    const current = state.liveStatus.get(update.device_ip) || {};
+    state.liveStatus.set(update.device_ip, { ...current, ...update });
+  });
+
+  const selectedIp = state.selectedDevice?.ip_address;
+  if (selectedIp && updates.some((update) => update.device_ip === selectedIp)) {
+    renderStatus(state.liveStatus.get(selectedIp));
+  }
+}
+
+function connectStatusStream() {
+  if (!window.EventSource || state.statusStream) {
+    return;
+  }
+
+  // Изменения статуса приходят от сервера по мере опроса устройств
+  const stream = new EventSource("/api/monitoring/stream");
+  stream.addEventListener("snapshot", (event) => {
+    state.liveStatus.clear();
+    applyLiveUpdates(JSON.parse(event.data));
+  });
+  stream.addEventListener("update", (event) => applyLiveUpdates(JSON.parse(event.data)));
+  state.statusStream = stream;
+}
+
 function selectDevice(device) {
   state.selectedDevice = device;
+  state.selectedAvailability = null;
   elements.deviceDetailsCard.hidden = false;
   elements.deviceDetailsTitle.textContent = `Детали устройства ${device.ip_address}`;
   loadDeviceDetails(device.ip_address);
@@ -243,8 +365,7 @@ async function handleLogin(event) {
     });
 
     if (response?.access_token) {
-      state.token = response.access_token;
-      localStorage.setItem("authToken", state.token);
+      storeSession(response);
       setStatus(elements.authStatus, "Успешный вход. Токен сохранён.", "success");
       updateAuthUI();
     } else {
@@ -256,9 +377,18 @@ async function handleLogin(event) {
   }
 }
 
-function handleLogout() {
-  state.token = null;
-  localStorage.removeItem("authToken");
+async function handleLogout() {
+  if (state.token || state.refreshToken) {
+    try {
+      await apiRequest("/api/auth/logout", {
+        method: "POST",
+        body: { refresh_token: state.refreshToken },
+      });
+    } catch (error) {
+      console.warn("Не удалось завершить сессию на сервере", error);
+    }
+  }
+  storeSession(null);
   updateAuthUI();
   setStatus(elements.authStatus, "Вы вышли из системы.", "success");
 }
@@ -312,9 +442,11 @@ async function handleCheckNow() {
 
 updateAuthUI();
 loadDevices();
+connectStatusStream();
 
 elements.loginForm.addEventListener("submit", handleLogin);
 elements.logoutButton.addEventListener("click", handleLogout);
-elements.refreshDevices.addEventListener("click", loadDevices);
+elements.refreshDevices.addEventListener("click", () => loadDevices());
+elements.devicesMore.addEventListener("click", () => loadDevices(true));
 elements.createDeviceForm.addEventListener("submit", handleCreateDevice);
 elements.checkNow.addEventListener("click", handleCheckNow);
@@ -0,0 +1,385 @@
+"""Оповещения по метрикам опроса: оценка правил в момент получения данных.
+
+Результаты опроса проходят через AlertEvaluator сразу после
+публикации писателю метрик, поэтому правила не перечитывают таблицу
+метрик по расписанию. Для каждого ряда (устройство, метрика, объект -
+например, интерфейс) хранится состояние фиксированного размера,
+обновляемое за O(1) на значение:
+
+* EWMA среднего и дисперсии - базовая линия ряда;
+* скользящие квантили (p50, p95) - стохастическая оценка, которая
+  сдвигается к каждому новому значению на шаг, пропорциональный
+  разбросу ряда;
+* счётчик смен состояния с экспоненциальным затуханием - детектор
+  флаппинга.
+
+Виды оповещений: threshold - значение выше порога правила, anomaly -
+значение выше базовой линии более чем на z_fire стандартных
+отклонений, flapping - частая смена состояния ряда (оповещений или
+самого значения, например oper_status интерфейса). Оповещение
+срабатывает и снимается только после for_samples значений подряд,
+порог снятия ниже порога срабатывания (гистерезис). Пока
+ряд во флаппинге, срабатывания и снятия остальных оповещений не
+рассылаются; после выхода из флаппинга их состояние досылается.
+
+Состояние рядов устройства хранится в hash Redis alerts:state:{ip}
+(поле - метрика|объект, значение - JSON) и общее для всех воркеров.
+В базу пишутся только срабатывания и снятия: открытое оповещение
+ряда одного вида всегда одно (дедупликация).
+"""
+import copy
+import datetime
+import json
+import logging
+import math
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import tuple_, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from .models import Alert
+
+logger = logging.getLogger(__name__)
+
+KIND_THRESHOLD = "threshold"
+KIND_ANOMALY = "anomaly"
+KIND_FLAPPING = "flapping"
+
+STATE_FIRING = "firing"
+STATE_RESOLVED = "resolved"
+
+QUANTILES = (0.5, 0.95)
+
+
+class Rule:
+    """Правило метрики.
+
+    fire/clear - порог срабатывания и снятия (None - без порога),
+    anomaly - детектор аномалий, counter - значение является счётчиком
+    и оценивается его скорость в секунду, track_changes - смена
+    значения учитывается детектором флаппинга, min_std - нижняя
+    граница стандартного отклонения для почти постоянных рядов.
+    """
+
+    def __init__(self, fire: Optional[float] = None, clear: Optional[float] = None, severity: str = "warning",
+                 anomaly: bool = True, counter: bool = False, track_changes: bool = False,
+                 min_std: float = 1.0):
+        self.fire = fire
+        self.clear = fire if clear is None else clear
+        self.severity = severity
+        self.anomaly = anomaly
+        self.counter = counter
+        self.track_changes = track_changes
+        self.min_std = min_std
+
+
+DEFAULT_RULES = {
+    'cpu_usage': Rule(fire=90.0, clear=80.0, min_std=5.0),
+    'memory_usage': Rule(fire=90.0, clear=85.0, min_std=5.0),
+    # Скорость роста ifInErrors, ошибок в секунду
+    'interface_errors': Rule(fire=1.0, clear=0.1, counter=True, min_std=0.1),
+    # 1 - интерфейс работает, 0 - нет (только для административно включённых)
+    'interface_oper': Rule(anomaly=False, track_changes=True),
+}
+
+
+def parse_thresholds(spec: Optional[str], rules: Dict[str, Rule]) -> Dict[str, Rule]:
+    """Пороги из строки вида "cpu_usage=95:85,memory_usage=90" (срабатывание[:снятие])"""
+    for item in (spec or "").split(","):
+        if not item.strip():
+            continue
+        name, _, values = item.partition("=")
+        fire, _, clear = values.partition(":")
+        name = name.strip()
+        rule = rules[name] = copy.copy(rules.get(name) or Rule())
+        rule.fire = float(fire)
+        rule.clear = float(clear) if clear else rule.fire
+    return rules
+
+
+def poll_samples(results: Dict[str, Dict], interfaces: Dict[str, List[Dict]]) -> List[Tuple[str, str, str, float]]:
+    """Значения результатов опроса для оценки: [(IP, метрика, объект, значение)]"""
+    samples = [
+        (device_ip, name, '', float(value))
+        for device_ip, metrics in results.items()
+        for name, value in metrics.items()
+        if isinstance(value, (int, float))
+    ]
+    for device_ip, device_interfaces in interfaces.items():
+        for interface in device_interfaces:
+            target = interface['interface_name'][:64]
+            samples.append((device_ip, 'interface_errors', target, float(interface['error_count'])))
+            if interface['admin_status'] == 'up':
+                samples.append((device_ip, 'interface_oper', target,
+                                1.0 if interface['oper_status'] == 'up' else 0.0))
+    return samples
+
+
+def _label(metric: str, target: str) -> str:
+    return f"{metric} ({target})" if target else metric
+
+
+class AlertEvaluator:
+    """Оценка правил по потоку значений с состоянием рядов в Redis"""
+
+    def __init__(self, redis_client, rules: Dict[str, Rule], span: int = 30, warmup: int = 20,
+                 z_fire: float = 4.0, z_clear: float = 2.0, for_samples: int = 2,
+                 flap_window: int = 20, flap_threshold: float = 3.0, quantile_rate: float = 0.05,
+                 outlier_weight: float = 0.25, ttl: int = 7 * 86400, async_client=None, prefix: str = "alerts:state"):
+        self.redis = redis_client
+        self.async_redis = async_client
+        self.rules = rules
+        # Вес нового значения EWMA для окна из span значений
+        self.alpha = 2.0 / (span + 1)
+        self.outlier_weight = outlier_weight
+        self.warmup = warmup
+        self.z_fire = z_fire
+        self.z_clear = z_clear
+        self.for_samples = for_samples
+        self.flap_decay = 1.0 - 1.0 / flap_window
+        self.flap_threshold = flap_threshold
+        self.quantile_rate = quantile_rate
+        # Состояние устройств, которые перестали опрашивать, удаляется
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def key(self, device_ip: str) -> str:
+        return f"{self.prefix}:{device_ip}"
+
+    @staticmethod
+    def _decode(entries: Dict) -> Dict[str, Dict]:
+        return {
+            (field.decode() if isinstance(field, bytes) else field): json.loads(value)
+            for field, value in (entries or {}).items()
+        }
+
+    def _load(self, device_ips: List[str]) -> Dict[str, Dict[str, Dict]]:
+        pipe = self.redis.pipeline(transaction=False)
+        for device_ip in device_ips:
+            pipe.hgetall(self.key(device_ip))
+        return {device_ip: self._decode(entries) for device_ip, entries in zip(device_ips, pipe.execute())}
+
+    async def load_async(self, device_ip: str) -> Dict[str, Dict]:
+        """Состояние рядов устройства для обработчиков API"""
+        return self._decode(await self.async_redis.hgetall(self.key(device_ip)))
+
+    def _hysteresis(self, alert: Dict, fire: bool, clear: bool) -> bool:
+        """Смена состояния оповещения после for_samples значений подряд; True - состояние изменилось"""
+        pending = clear if alert['firing'] else fire
+        alert['streak'] = alert['streak'] + 1 if pending else 0
+        if alert['streak'] < self.for_samples:
+            return False
+        alert['firing'] = not alert['firing']
+        alert['streak'] = 0
+        return True
+
+    def _update(self, series: Dict, rule: Rule, value: float, now: float) -> Optional[Dict]:
+        """Учёт значения в состоянии ряда. Возвращает описание для оповещений или None"""
+        if rule.counter:
+            previous, previous_at = series.get('raw'), series.get('raw_at')
+            series['raw'], series['raw_at'] = value, now
+            if previous is None or now <= previous_at or value < previous:
+                # Первое значение или сброс счётчика - скорости ещё нет
+                return None
+            value = (value - previous) / (now - previous_at)
+
+        samples = series.get('n', 0)
+        mean = series.get('mean', value)
+        var = series.get('var', 0.0)
+        std = max(math.sqrt(var), rule.min_std)
+        # Отклонение от базовой линии до учёта самого значения
+        z = (value - mean) / std
+        changed = rule.track_changes and samples > 0 and value != series.get('last')
+
+        delta = value - mean
+        # Выброс сдвигает базовую линию медленнее, иначе аномалия поглощается за пару значений
+        alpha = self.alpha * self.outlier_weight if samples >= self.warmup and abs(z) >= self.z_fire else self.alpha
+        quantiles = series.get('q') or {}
+        for fraction in QUANTILES:
+            name = f"p{int(fraction * 100)}"
+            estimate = quantiles.get(name, value)
+            quantiles[name] = estimate + self.quantile_rate * std * (fraction - (1.0 if value < estimate else 0.0))
+        series.update(
+            n=samples + 1,
+            mean=mean + alpha * delta,
+            var=(1 - alpha) * (var + alpha * delta * delta),
+            q=quantiles,
+            last=value,
+            at=now,
+        )
+        return {'value': value, 'mean': mean, 'std': std, 'z': z, 'warm': samples >= self.warmup,
+                'changed': changed}
+
+    def _evaluate_series(self, series: Dict, rule: Rule, observed: Dict) -> List[Tuple[str, bool]]:
+        """Смена состояния оповещений ряда: [(вид, сработало)] к рассылке"""
+        alerts = series.setdefault('alerts', {})
+        changes = 1 if observed['changed'] else 0
+
+        checks = []
+        if rule.fire is not None:
+            checks.append((KIND_THRESHOLD, observed['value'] >= rule.fire, observed['value'] < rule.clear))
+        if rule.anomaly:
+            checks.append((KIND_ANOMALY, observed['warm'] and observed['z'] >= self.z_fire,
+                           observed['z'] < self.z_clear))
+        states = [alerts.setdefault(kind, {'firing': False, 'streak': 0, 'reported': False}) for kind, _, _ in checks]
+        alerting = any(alert['firing'] for alert in states)
+        for alert, (_, fire, clear) in zip(states, checks):
+            self._hysteresis(alert, fire, clear)
+        # Смена состояния ряда - появление или снятие любого его оповещения
+        if alerting != any(alert['firing'] for alert in states):
+            changes += 1
+
+        flap = series.get('flap', 0.0) * self.flap_decay + changes
+        series['flap'] = flap
+        flapping = alerts.setdefault(KIND_FLAPPING, {'firing': False, 'streak': 0, 'reported': False})
+        if not flapping['firing'] and flap >= self.flap_threshold:
+            flapping['firing'] = True
+        elif flapping['firing'] and flap < self.flap_threshold / 2:
+            flapping['firing'] = False
+
+        reported = []
+        for kind, alert in alerts.items():
+            # Во время флаппинга рассылается только само оповещение о флаппинге
+            if flapping['firing'] and kind != KIND_FLAPPING:
+                continue
+            if alert['reported'] != alert['firing']:
+                alert['reported'] = alert['firing']
+                reported.append((kind, alert['firing']))
+        return reported
+
+    def _event(self, device_ip: str, metric: str, target: str, rule: Rule, kind: str, firing: bool,
+               observed: Dict, at: datetime.datetime) -> Dict:
+        label = _label(metric, target)
+        value = observed['value']
+        if kind == KIND_THRESHOLD:
+            threshold = rule.fire
+            message = f"{label} = {value:.2f}, порог {threshold:g}"
+        elif kind == KIND_ANOMALY:
+            threshold = observed['mean'] + self.z_fire * observed['std']
+            message = f"{label} = {value:.2f}, обычно {observed['mean']:.2f} ± {observed['std']:.2f}"
+        else:
+            threshold = self.flap_threshold
+            message = f"{label}: частая смена состояния"
+        return {
+            'device_ip': device_ip,
+            'metric': metric,
+            'target': target,
+            'kind': kind,
+            'severity': rule.severity,
+            'state': STATE_FIRING if firing else STATE_RESOLVED,
+            'value': value,
+            'threshold': threshold,
+            'message': message,
+            'at': at,
+        }
+
+    def evaluate(self, samples: Iterable[Tuple[str, str, str, float]],
+                 timestamp: Optional[datetime.datetime] = None) -> List[Dict]:
+        """Учёт значений [(IP, метрика, объект, значение)] одного опроса. Возвращает срабатывания и снятия"""
+        samples = [sample for sample in samples if sample[1] in self.rules]
+        if not samples:
+            return []
+        timestamp = timestamp or datetime.datetime.now()
+        now = timestamp.timestamp()
+        device_ips = list(dict.fromkeys(device_ip for device_ip, _, _, _ in samples))
+        try:
+            states = self._load(device_ips)
+        except Exception as e:
+            logger.warning(f"Failed to load alert state of {len(device_ips)} devices: {e}")
+            return []
+
+        events = []
+        updates: Dict[str, Dict[str, str]] = defaultdict(dict)
+        for device_ip, metric, target, value in samples:
+            field = f"{metric}|{target}"
+            series = states[device_ip].setdefault(field, {})
+            rule = self.rules[metric]
+            observed = self._update(series, rule, value, now)
+            if observed is not None:
+                for kind, firing in self._evaluate_series(series, rule, observed):
+                    events.append(self._event(device_ip, metric, target, rule, kind, firing, observed, timestamp))
+            updates[device_ip][field] = json.dumps(series)
+
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for device_ip, mapping in updates.items():
+                pipe.hset(self.key(device_ip), mapping=mapping)
+                pipe.expire(self.key(device_ip), self.ttl)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to save alert state of {len(updates)} devices: {e}")
+        return events
+
+
+def describe_series(field: str, series: Dict) -> Dict:
+    """Базовая линия и состояние оповещений ряда для ответа API"""
+    metric, _, target = field.partition("|")
+    return {
+        'metric': metric,
+        'target': target or None,
+        'samples': series.get('n', 0),
+        'last': series.get('last'),
+        'mean': series.get('mean'),
+        'std': math.sqrt(series['var']) if 'var' in series else None,
+        'quantiles': series.get('q') or {},
+        'flap_score': round(series.get('flap', 0.0), 3),
+        'firing': sorted(kind for kind, alert in (series.get('alerts') or {}).items() if alert['firing']),
+        'updated_at': series.get('at'),
+    }
+
+
+def save_alert_events(db: Session, events: List[Dict]):
+    """Запись срабатываний (новые строки) и снятий (закрытие открытых строк) в сессии вызывающего"""
+    fired = [event for event in events if event['state'] == STATE_FIRING]
+    if fired:
+        # Открытое оповещение ряда уже есть (повторная доставка) - вторая строка не создаётся
+        db.execute(insert(Alert).values([
+            {
+                'device_ip': event['device_ip'],
+                'metric': event['metric'],
+                'target': event['target'],
+                'kind': event['kind'],
+                'severity': event['severity'],
+                'state': STATE_FIRING,
+                'value': event['value'],
+                'threshold': event['threshold'],
+                'message': event['message'],
+                'started_at': event['at'],
+            }
+            for event in fired
+        ]).on_conflict_do_nothing())
+
+    resolved: Dict[datetime.datetime, List[Tuple[str, str, str, str]]] = defaultdict(list)
+    for event in events:
+        if event['state'] == STATE_RESOLVED:
+            resolved[event['at']].append((event['device_ip'], event['metric'], event['target'], event['kind']))
+    for at, keys in resolved.items():
+        db.execute(
+            update(Alert)
+            .where(tuple_(Alert.device_ip, Alert.metric, Alert.target, Alert.kind).in_(keys),
+                   Alert.resolved_at.is_(None))
+            .values(state=STATE_RESOLVED, resolved_at=at),
+            execution_options={"synchronize_session": False}
+        )
+
+
+def alert_snapshot(alert) -> Dict:
+    """Оповещение (строка Alert) в виде словаря ответа API"""
+    return {
+        'id': alert.id,
+        'device_ip': alert.device_ip,
+        'metric': alert.metric,
+        'target': alert.target or None,
+        'kind': alert.kind,
+        'severity': alert.severity,
+        'state': alert.state,
+        'value': alert.value,
+        'threshold': alert.threshold,
+        'message': alert.message,
+        'started_at': alert.started_at.isoformat() if alert.started_at else None,
+        'resolved_at': alert.resolved_at.isoformat() if alert.resolved_at else None,
+        'acknowledged_at': alert.acknowledged_at.isoformat() if alert.acknowledged_at else None,
+        'acknowledged_by': alert.acknowledged_by,
+    }
@@ -0,0 +1,240 @@
+"""Учёт доступности устройств и отчёты SLA.
+
+Вместо счётчика, который увеличивается при каждой проверке,
+хранятся только смены состояния: интервалы "доступно"/"недоступно"
+с временем начала и конца (availability_intervals, у текущего
+интервала конец не задан). Закрытый интервал сразу добавляется в
+дневной агрегат (availability_daily: секунды up/down по устройству и
+дню), поэтому отчёт за N дней читает не больше N строк агрегата на
+устройство и текущий интервал - стоимость не зависит от числа
+проверок.
+
+Окно отчёта - последние N календарных дней, включая текущий: границы
+окна совпадают с границами дней агрегата, и доступность считается
+точно. Время, когда устройство ещё не наблюдалось, в отчёт не входит.
+"""
+import datetime
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import cast, func, select, text, update
+from sqlalchemy.dialects.postgresql import CIDR, INET, insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .models import AvailabilityDaily, AvailabilityInterval
+
+logger = logging.getLogger(__name__)
+
+# Стандартные окна отчёта, дней
+PERIODS = {'day': 1, 'week': 7, 'month': 30}
+
+
+def split_by_day(start: datetime.datetime, end: datetime.datetime) -> List[Tuple[datetime.date, float]]:
+    """Длительность интервала по дням: [(день, секунды), ...]"""
+    parts = []
+    while start < end:
+        midnight = datetime.datetime.combine(start.date() + datetime.timedelta(days=1), datetime.time())
+        boundary = min(midnight, end)
+        parts.append((start.date(), (boundary - start).total_seconds()))
+        start = boundary
+    return parts
+
+
+def window_start(days: int, now: Optional[datetime.datetime] = None) -> datetime.datetime:
+    """Начало окна из days календарных дней, последний из которых - текущий"""
+    now = now or datetime.datetime.now()
+    return datetime.datetime.combine(now.date() - datetime.timedelta(days=days - 1), datetime.time())
+
+
+def current_uptime(is_online: bool, up_since: Optional[datetime.datetime],
+                   sys_uptime: Optional[float] = None, sys_uptime_at: Optional[datetime.datetime] = None,
+                   now: Optional[datetime.datetime] = None) -> float:
+    """Время работы устройства в секундах.
+
+    sysUpTime (снят в sys_uptime_at) точнее проверок доступности: он
+    учитывает время работы до начала наблюдения и не теряет
+    перезагрузки, которые короче интервала проверок. Значение,
+    снятое до последнего восстановления доступности, устарело - тогда
+    время работы отсчитывается от начала текущего интервала up.
+    """
+    if not is_online:
+        return 0.0
+    now = now or datetime.datetime.now()
+    if sys_uptime is not None and sys_uptime_at is not None and (up_since is None or sys_uptime_at >= up_since):
+        return max(0.0, sys_uptime + (now - sys_uptime_at).total_seconds())
+    if up_since is not None:
+        return max(0.0, (now - up_since).total_seconds())
+    return 0.0
+
+
+def record_transitions(db: Session, transitions: Dict[str, bool], at: datetime.datetime):
+    """Смена состояния устройств ({IP: доступно}) в момент at.
+
+    Текущие интервалы закрываются и добавляются в дневной агрегат,
+    открываются интервалы нового состояния. Выполняется в сессии
+    вызывающего, фиксация - вместе со статусами устройств.
+    """
+    if not transitions:
+        return
+    closed = db.execute(
+        update(AvailabilityInterval)
+        .where(AvailabilityInterval.device_ip.in_(list(transitions)), AvailabilityInterval.ended_at.is_(None))
+        .values(ended_at=at)
+        .returning(AvailabilityInterval.device_ip, AvailabilityInterval.is_up, AvailabilityInterval.started_at),
+        execution_options={"synchronize_session": False}
+    ).all()
+
+    totals: Dict[Tuple[str, datetime.date], List[float]] = defaultdict(lambda: [0.0, 0.0])
+    for device_ip, is_up, started_at in closed:
+        for day, seconds in split_by_day(started_at, at):
+            totals[(device_ip, day)][0 if is_up else 1] += seconds
+    if totals:
+        stmt = insert(AvailabilityDaily).values([
+            {'device_ip': device_ip, 'day': day, 'up_seconds': up, 'down_seconds': down}
+            for (device_ip, day), (up, down) in sorted(totals.items())
+        ])
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[AvailabilityDaily.device_ip, AvailabilityDaily.day],
+            set_={
+                'up_seconds': AvailabilityDaily.up_seconds + stmt.excluded.up_seconds,
+                'down_seconds': AvailabilityDaily.down_seconds + stmt.excluded.down_seconds,
+            }
+        ))
+
+    db.execute(insert(AvailabilityInterval).values([
+        {'device_ip': device_ip, 'is_up': is_up, 'started_at': at}
+        for device_ip, is_up in transitions.items()
+    ]))
+
+
+def _scoped(query, column, device_ips: Optional[Iterable[str]], subnet: Optional[str]):
+    if device_ips is not None:
+        query = query.where(column.in_(list(device_ips)))
+    if subnet:
+        query = query.where(cast(column, INET).op('<<=')(cast(subnet, CIDR)))
+    return query
+
+
+async def availability_report(db: AsyncSession, days: int, device_ips: Optional[Iterable[str]] = None,
+                              subnet: Optional[str] = None,
+                              now: Optional[datetime.datetime] = None) -> Dict[str, Dict]:
+    """Доступность устройств за последние days дней: {IP: отчёт}.
+
+    Закрытые интервалы берутся из дневного агрегата, текущий интервал
+    добавляется до момента now.
+    """
+    now = now or datetime.datetime.now()
+    since = window_start(days, now)
+    if device_ips is not None:
+        device_ips = list(device_ips)
+    totals: Dict[str, List[float]] = defaultdict(lambda: [0.0, 0.0])
+
+    daily = await db.execute(_scoped(
+        select(AvailabilityDaily.device_ip, func.sum(AvailabilityDaily.up_seconds),
+               func.sum(AvailabilityDaily.down_seconds))
+        .where(AvailabilityDaily.day >= since.date())
+        .group_by(AvailabilityDaily.device_ip),
+        AvailabilityDaily.device_ip, device_ips, subnet
+    ))
+    for device_ip, up, down in daily:
+        totals[device_ip][0] += up or 0.0
+        totals[device_ip][1] += down or 0.0
+
+    current = await db.execute(_scoped(
+        select(AvailabilityInterval.device_ip, AvailabilityInterval.is_up, AvailabilityInterval.started_at)
+        .where(AvailabilityInterval.ended_at.is_(None)),
+        AvailabilityInterval.device_ip, device_ips, subnet
+    ))
+    states = {}
+    for device_ip, is_up, started_at in current:
+        states[device_ip] = is_up
+        seconds = (now - max(started_at, since)).total_seconds()
+        if seconds > 0:
+            totals[device_ip][0 if is_up else 1] += seconds
+
+    return {
+        device_ip: {
+            'device_ip': device_ip,
+            'is_online': states.get(device_ip),
+            'up_seconds': round(up, 3),
+            'down_seconds': round(down, 3),
+            'availability': round(up / (up + down) * 100, 4) if up + down > 0 else None,
+        }
+        for device_ip, (up, down) in totals.items()
+    }
+
+
+def summarize(reports: Iterable[Dict]) -> Dict:
+    """Доступность группы устройств (подсети): доля времени up по всем устройствам"""
+    up = down = 0.0
+    count = 0
+    for report in reports:
+        up += report['up_seconds']
+        down += report['down_seconds']
+        count += 1
+    return {
+        'devices': count,
+        'up_seconds': round(up, 3),
+        'down_seconds': round(down, 3),
+        'availability': round(up / (up + down) * 100, 4) if up + down > 0 else None,
+    }
+
+
+async def recent_intervals(db: AsyncSession, device_ip: str, since: datetime.datetime,
+                           limit: int = 100) -> List[Dict]:
+    """Интервалы устройства, пересекающие окно с начала since, новые первыми"""
+    rows = await db.execute(
+        select(AvailabilityInterval.is_up, AvailabilityInterval.started_at, AvailabilityInterval.ended_at)
+        .where(AvailabilityInterval.device_ip == device_ip)
+        .where((AvailabilityInterval.ended_at.is_(None)) | (AvailabilityInterval.ended_at > since))
+        .order_by(AvailabilityInterval.started_at.desc())
+        .limit(limit)
+    )
+    return [
+        {
+            'state': 'up' if is_up else 'down',
+            'started_at': started_at.isoformat(),
+            'ended_at': ended_at.isoformat() if ended_at else None,
+        }
+        for is_up, started_at, ended_at in rows
+    ]
+
+
+def prepare_availability_tables(engine: Engine):
+    """Перевод статусов прежних версий на учёт интервалов.
+
+    Добавляет колонку up_since и открывает текущий интервал каждого
+    устройства, у которого его ещё нет; начало интервала доступного
+    устройства оценивается по прежнему счётчику uptime.
+    """
+    with engine.begin() as conn:
+        # ALTER TABLE берёт ACCESS EXCLUSIVE даже с IF NOT EXISTS - только для старой схемы
+        migrated = conn.scalar(text(
+            "SELECT 1 FROM information_schema.columns WHERE table_schema = current_schema() "
+            "AND table_name = 'device_status' AND column_name = 'up_since'"
+        ))
+        if not migrated:
+            conn.execute(text("ALTER TABLE device_status ADD COLUMN up_since TIMESTAMP WITHOUT TIME ZONE"))
+            conn.execute(text(
+                "UPDATE device_status SET up_since = last_check - make_interval(secs => COALESCE(uptime, 0)) "
+                "WHERE is_online AND up_since IS NULL AND last_check IS NOT NULL"
+            ))
+        # Несколько процессов могут выполнять миграцию одновременно
+        conn.execute(text(
+            "INSERT INTO availability_intervals (device_ip, is_up, started_at) "
+            "SELECT device_ip, is_online, COALESCE(up_since, last_check) FROM device_status s "
+            "WHERE last_check IS NOT NULL AND NOT EXISTS ("
+            "SELECT 1 FROM availability_intervals i WHERE i.device_ip = s.device_ip AND i.ended_at IS NULL) "
+            "ON CONFLICT DO NOTHING"
+        ))
+
+
+def prune_availability(engine: Engine, retention_days: int, today: Optional[datetime.date] = None):
+    """Удаление агрегатов и закрытых интервалов старше retention_days дней"""
+    cutoff = (today or datetime.date.today()) - datetime.timedelta(days=retention_days)
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM availability_daily WHERE day < :cutoff"), {"cutoff": cutoff})
+        conn.execute(text("DELETE FROM availability_intervals WHERE ended_at < :cutoff"), {"cutoff": cutoff})
@@ -0,0 +1,374 @@
+"""Кеш последнего состояния устройств в Redis.
+
+Для каждого устройства хранится один hash device:{ip} со статусом
+доступности, временем отклика, последними системными метриками и
+снимком интерфейсов. Hash перезаписывается задачами опроса и живёт
+ttl секунд с последней записи: устройство, которое перестали
+опрашивать, выпадает из кеша, и чтение уходит в базу.
+
+Множество device:index содержит адреса всех закешированных устройств
+и позволяет отдать состояние всего парка одним обращением к Redis.
+Адрес остаётся в индексе и после истечения hash: такие устройства
+известны и дочитываются из базы. Индекс сокращается при синхронизации
+с инвентарём (retain).
+Изменения, записанные задачами опроса, публикуются в канал
+device:updates для потока /stream: только устройства, у которых
+сменились доступность, начало интервала, заметно изменилось время
+отклика или значения метрик, и только изменившиеся поля.
+"""
+import datetime
+import json
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .availability import current_uptime
+
+logger = logging.getLogger(__name__)
+
+# Поля hash, из которых собирается статус устройства. Снимок
+# интерфейсов (сотни портов у магистральных коммутаторов) читается
+# только для отдельного устройства.
+STATUS_FIELDS = ('is_online', 'response_time', 'last_check', 'uptime', 'up_since', 'metrics', 'metrics_at')
+
+# Состояние всего парка одним запросом: адреса из индекса и поля статуса
+# их hash-ей (ARGV[2..]), вторым элементом - адреса, hash которых истёк
+_LOAD_ALL_SCRIPT = """
+local result = {}
+local expired = {}
+for _, ip in ipairs(redis.call('SMEMBERS', KEYS[1])) do
+    local key = ARGV[1] .. ip
+    local values = redis.call('HMGET', key, unpack(ARGV, 2))
+    if values[1] or redis.call('EXISTS', key) == 1 then
+        result[#result + 1] = ip
+        result[#result + 1] = values
+    else
+        expired[#expired + 1] = ip
+    end
+end
+return {result, expired}
+"""
+
+
+def _text(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _isoformat(value) -> Optional[str]:
+    return value.isoformat() if isinstance(value, datetime.datetime) else value
+
+
+def _parse_time(value) -> Optional[datetime.datetime]:
+    return datetime.datetime.fromisoformat(value) if value else None
+
+
+def status_snapshot(status) -> Dict:
+    """Статус устройства (строка DeviceStatus) в виде словаря ответа API"""
+    return {
+        'device_ip': status.device_ip,
+        'is_online': bool(status.is_online),
+        'response_time': status.response_time,
+        'last_check': _isoformat(status.last_check),
+        'uptime': current_uptime(bool(status.is_online), status.up_since),
+        'up_since': _isoformat(status.up_since),
+    }
+
+
+def interface_snapshot(interface) -> Dict:
+    """Состояние интерфейса (строка InterfaceStatus) в виде словаря ответа API"""
+    return {
+        'device_ip': interface.device_ip,
+        'interface_name': interface.interface_name,
+        'admin_status': interface.admin_status,
+        'oper_status': interface.oper_status,
+        'bandwidth_usage': interface.bandwidth_usage,
+        'error_count': interface.error_count,
+        'timestamp': _isoformat(interface.timestamp),
+    }
+
+
+def _encode_status(snapshot: Dict) -> Dict[str, str]:
+    return {
+        'is_online': '1' if snapshot['is_online'] else '0',
+        'response_time': '' if snapshot['response_time'] is None else str(snapshot['response_time']),
+        'last_check': snapshot['last_check'] or '',
+        'uptime': str(snapshot['uptime']),
+        'up_since': snapshot.get('up_since') or '',
+    }
+
+
+def _status_fields(values: List) -> Dict:
+    """Ответ HMGET по STATUS_FIELDS в виде hash без отсутствующих полей"""
+    return {name: value for name, value in zip(STATUS_FIELDS, values) if value is not None}
+
+
+def decode_entry(device_ip: str, fields: Dict) -> Optional[Dict]:
+    """Разбор hash устройства. None - в кеше нет статуса устройства.
+
+    Время работы пересчитывается на момент чтения: по sysUpTime из
+    последних метрик или от начала текущего интервала доступности.
+    """
+    fields = {_text(key): _text(value) for key, value in fields.items()}
+    if 'is_online' not in fields:
+        return None
+
+    entry = {
+        'device_ip': device_ip,
+        'is_online': fields['is_online'] == '1',
+        'response_time': float(fields['response_time']) if fields.get('response_time') else None,
+        'last_check': fields.get('last_check') or None,
+        'uptime': float(fields.get('uptime') or 0),
+        'up_since': fields.get('up_since') or None,
+    }
+    sys_uptime = sys_uptime_at = None
+    if 'metrics' in fields:
+        entry['metrics'] = json.loads(fields['metrics'])
+        entry['metrics_at'] = fields.get('metrics_at')
+        sys_uptime = entry['metrics'].get('sys_uptime')
+        sys_uptime_at = _parse_time(entry['metrics_at'])
+    if 'up_since' in fields:
+        entry['uptime'] = current_uptime(entry['is_online'], _parse_time(entry['up_since']),
+                                         sys_uptime, sys_uptime_at)
+    return entry
+
+
+def decode_interfaces(device_ip: str, fields: Dict) -> Optional[List[Dict]]:
+    """Снимок интерфейсов из hash устройства в формате ответа API"""
+    fields = {_text(key): _text(value) for key, value in fields.items()}
+    if 'interfaces' not in fields:
+        return None
+    timestamp = fields.get('interfaces_at')
+    return [
+        {
+            'device_ip': device_ip,
+            'interface_name': interface['interface_name'],
+            'admin_status': interface['admin_status'],
+            'oper_status': interface['oper_status'],
+            'bandwidth_usage': interface['bandwidth_usage'],
+            'error_count': interface['error_count'],
+            'timestamp': timestamp,
+        }
+        for interface in json.loads(fields['interfaces'])
+    ]
+
+
+class StatusCache:
+    """Последнее состояние устройств в Redis.
+
+    Запись выполняют задачи Celery через синхронный клиент, чтение -
+    обработчики API через клиент redis.asyncio.
+    """
+
+    def __init__(self, redis_client, async_client=None, ttl: int = 600, prefix: str = "device",
+                 response_time_delta: float = 0.2):
+        self.redis = redis_client
+        self.async_redis = async_client
+        self.ttl = ttl
+        self.prefix = prefix
+        # Относительное изменение времени отклика, о котором сообщается подписчикам
+        self.response_time_delta = response_time_delta
+        self.index_key = f"{prefix}:index"
+        self.channel = f"{prefix}:updates"
+        self._load_all = async_client.register_script(_LOAD_ALL_SCRIPT) if async_client is not None else None
+
+    def key(self, device_ip: str) -> str:
+        return f"{self.prefix}:{device_ip}"
+
+    def _fill(self, pipe, entries: Dict[str, Dict[str, str]], updates: Optional[List[Dict]] = None):
+        for device_ip, mapping in entries.items():
+            key = self.key(device_ip)
+            pipe.hset(key, mapping=mapping)
+            pipe.expire(key, self.ttl)
+        pipe.sadd(self.index_key, *entries)
+        if updates:
+            # Одно сообщение на пакет опроса, а не на устройство
+            pipe.publish(self.channel, json.dumps(updates))
+
+    def _write(self, entries: Dict[str, Dict[str, str]], updates: Optional[List[Dict]] = None):
+        if not entries:
+            return
+        pipe = self.redis.pipeline(transaction=False)
+        self._fill(pipe, entries, updates)
+        try:
+            pipe.execute()
+        except Exception as e:
+            # Кеш не должен ронять опрос: при промахе чтение уйдёт в базу
+            logger.warning(f"Failed to update status cache for {len(entries)} devices: {e}")
+
+    def _cached(self, device_ips: List[str], fields: Iterable[str]) -> Dict[str, List]:
+        """Текущие значения полей hash-ей перед перезаписью (пустой словарь при ошибке Redis)"""
+        fields = list(fields)
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for device_ip in device_ips:
+                pipe.hmget(self.key(device_ip), *fields)
+            return {
+                device_ip: [_text(value) for value in values]
+                for device_ip, values in zip(device_ips, pipe.execute())
+            }
+        except Exception as e:
+            logger.warning(f"Failed to read cached state of {len(device_ips)} devices: {e}")
+            return {}
+
+    def _status_delta(self, snapshot: Dict, cached: Optional[List]) -> Optional[Dict]:
+        """Изменившиеся поля статуса или None; устройство не в кеше - полный статус"""
+        is_online, response_time, up_since = cached or (None, None, None)
+        if is_online is None:
+            return snapshot
+        delta = {}
+        if (is_online == '1') != snapshot['is_online']:
+            delta['is_online'] = snapshot['is_online']
+        if (up_since or None) != snapshot.get('up_since'):
+            delta['up_since'] = snapshot.get('up_since')
+            delta['uptime'] = snapshot['uptime']
+        previous = float(response_time) if response_time else None
+        current = snapshot['response_time']
+        if (previous is None) != (current is None) or (
+                current is not None and abs(current - previous) > self.response_time_delta * max(previous, 1.0)):
+            delta['response_time'] = current
+        if not delta:
+            return None
+        return {'device_ip': snapshot['device_ip'], 'last_check': snapshot['last_check'], **delta}
+
+    def store_statuses(self, snapshots: Iterable[Dict]):
+        """Запись статусов доступности (словари status_snapshot)"""
+        snapshots = list(snapshots)
+        cached = self._cached([snapshot['device_ip'] for snapshot in snapshots],
+                              ('is_online', 'response_time', 'up_since'))
+        updates = []
+        for snapshot in snapshots:
+            delta = self._status_delta(snapshot, cached.get(snapshot['device_ip']))
+            if delta is not None:
+                updates.append(delta)
+        self._write({snapshot['device_ip']: _encode_status(snapshot) for snapshot in snapshots}, updates)
+
+    async def warm_statuses(self, snapshots: Iterable[Dict]):
+        """Прогрев кеша статусами из базы, без уведомления подписчиков"""
+        entries = {snapshot['device_ip']: _encode_status(snapshot) for snapshot in snapshots}
+        if not entries:
+            return
+        try:
+            async with self.async_redis.pipeline(transaction=False) as pipe:
+                self._fill(pipe, entries)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to warm status cache for {len(entries)} devices: {e}")
+
+    def store_metrics(self, results: Dict[str, Dict], interfaces: Dict[str, List[Dict]],
+                      timestamp: Optional[datetime.datetime] = None):
+        """Запись системных метрик и снимка интерфейсов.
+
+        Пустой результат тоже записывается, чтобы в кеше не оставались
+        метрики устройства, переставшего отвечать по SNMP.
+        """
+        timestamp = (timestamp or datetime.datetime.now()).isoformat()
+        values = {
+            device_ip: {name: value for name, value in metrics.items() if value is not None}
+            for device_ip, metrics in results.items()
+        }
+        cached = self._cached(list(values), ('metrics',))
+        updates = []
+        for device_ip, metrics in values.items():
+            previous = (cached.get(device_ip) or [None])[0]
+            if previous is None:
+                changed = metrics
+            else:
+                previous = json.loads(previous)
+                # Пропавшая метрика передаётся как null
+                changed = {name: None for name in previous if name not in metrics}
+                changed.update({name: value for name, value in metrics.items() if previous.get(name) != value})
+                if not changed:
+                    continue
+            updates.append({'device_ip': device_ip, 'metrics': changed, 'metrics_at': timestamp})
+        self._write({
+            device_ip: {
+                'metrics': json.dumps(metrics),
+                'metrics_at': timestamp,
+                'interfaces': json.dumps(interfaces.get(device_ip, [])),
+                'interfaces_at': timestamp,
+            }
+            for device_ip, metrics in values.items()
+        }, updates)
+
+    def recent_availability(self, device_ips: List[str], max_age: float,
+                            now: Optional[datetime.datetime] = None) -> Dict[str, Optional[float]]:
+        """Результаты проверки доступности не старше max_age секунд: {IP: время отклика или None}.
+
+        Устройства без свежего статуса в результат не попадают. При
+        недоступности Redis возвращается пустой словарь.
+        """
+        if not device_ips:
+            return {}
+        now = now or datetime.datetime.now()
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for device_ip in device_ips:
+                pipe.hmget(self.key(device_ip), 'is_online', 'response_time', 'last_check')
+            replies = pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to read cached availability of {len(device_ips)} devices: {e}")
+            return {}
+
+        recent = {}
+        for device_ip, (is_online, response_time, last_check) in zip(device_ips, replies):
+            if is_online is None or not last_check:
+                continue
+            try:
+                checked_at = datetime.datetime.fromisoformat(_text(last_check))
+            except ValueError:
+                continue
+            if (now - checked_at).total_seconds() > max_age:
+                continue
+            if _text(is_online) == '1':
+                recent[device_ip] = float(response_time) if response_time else 0.0
+            else:
+                recent[device_ip] = None
+        return recent
+
+    async def load(self, device_ip: str) -> Dict:
+        """Сырой hash устройства (пустой словарь при промахе)"""
+        return await self.async_redis.hgetall(self.key(device_ip))
+
+    async def load_many(self, device_ips: List[str]) -> Dict[str, Dict]:
+        """Статусы перечисленных устройств одним конвейером. Промахи в результат не попадают"""
+        if not device_ips:
+            return {}
+        async with self.async_redis.pipeline(transaction=False) as pipe:
+            for device_ip in device_ips:
+                pipe.hmget(self.key(device_ip), *STATUS_FIELDS)
+            replies = await pipe.execute()
+
+        entries = {}
+        for device_ip, values in zip(device_ips, replies):
+            entry = decode_entry(device_ip, _status_fields(values))
+            if entry is not None:
+                entries[device_ip] = entry
+        return entries
+
+    async def load_fleet(self) -> Tuple[Dict[str, Dict], List[str]]:
+        """Статусы всех закешированных устройств и адреса из индекса без статуса в кеше"""
+        found, expired = await self._load_all(keys=[self.index_key], args=[f"{self.prefix}:", *STATUS_FIELDS])
+        entries = {}
+        missing = [_text(device_ip) for device_ip in expired]
+        for position in range(0, len(found), 2):
+            device_ip = _text(found[position])
+            entry = decode_entry(device_ip, _status_fields(found[position + 1]))
+            if entry is not None:
+                entries[device_ip] = entry
+            else:
+                missing.append(device_ip)
+        return entries, missing
+
+    async def load_all(self) -> Dict[str, Dict]:
+        """Статусы всех закешированных устройств"""
+        entries, _ = await self.load_fleet()
+        return entries
+
+    def retain(self, device_ips: Iterable[str]):
+        """Удаление из кеша и индекса устройств, исключённых из инвентаря"""
+        wanted = set(device_ips)
+        removed = [ip for ip in (_text(member) for member in self.redis.smembers(self.index_key)) if ip not in wanted]
+        if removed:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.srem(self.index_key, *removed)
+            pipe.delete(*[self.key(ip) for ip in removed])
+            pipe.execute()
@@ -0,0 +1,73 @@
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+COUNTER32_MAX = 2 ** 32
+COUNTER64_MAX = 2 ** 64
+
+
+def counter_delta(previous: int, current: int, bits: int) -> Optional[int]:
+    """Приращение счётчика с учётом переполнения"""
+    if current >= previous:
+        return current - previous
+    if bits == 32:
+        # Counter32 переполняется за минуты на гигабитных портах
+        return current + COUNTER32_MAX - previous
+    # Counter64 за интервал опроса переполниться не может - это сброс (перезагрузка)
+    return None
+
+
+class CounterStore:
+    """Хранилище предыдущих значений счётчиков интерфейсов для расчёта скорости.
+
+    Ключ - (IP устройства, ifIndex), значение - кортеж
+    (время, входящие октеты, исходящие октеты, разрядность счётчиков).
+    Размер ограничен: при превышении max_entries вытесняются давно
+    не обновлявшиеся записи, а записи старше max_age не используются.
+    """
+
+    def __init__(self, max_entries: int = 500000, max_age: float = 3600.0):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._samples: "OrderedDict[Tuple[str, int], Tuple[float, int, int, int]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def update(self, device_ip: str, if_index: int, in_octets: int, out_octets: int,
+               bits: int = 64, timestamp: Optional[float] = None) -> Tuple[Optional[float], Optional[float]]:
+        """Сохранение нового значения и расчёт скорости (бит/с) на входе и выходе"""
+        now = time.time() if timestamp is None else timestamp
+        key = (device_ip, if_index)
+        previous = self._samples.pop(key, None)
+        self._samples[key] = (now, in_octets, out_octets, bits)
+
+        if len(self._samples) > self.max_entries:
+            self._samples.popitem(last=False)
+
+        if previous is None:
+            return None, None
+
+        prev_time, prev_in, prev_out, prev_bits = previous
+        elapsed = now - prev_time
+        if elapsed <= 0 or elapsed > self.max_age or prev_bits != bits:
+            return None, None
+
+        in_delta = counter_delta(prev_in, in_octets, bits)
+        out_delta = counter_delta(prev_out, out_octets, bits)
+        in_bps = in_delta * 8 / elapsed if in_delta is not None else None
+        out_bps = out_delta * 8 / elapsed if out_delta is not None else None
+        return in_bps, out_bps
+
+    def prune(self, now: Optional[float] = None) -> int:
+        """Удаление устаревших записей"""
+        cutoff = (time.time() if now is None else now) - self.max_age
+        removed = 0
+        # Записи упорядочены по времени последнего обновления
+        while self._samples:
+            key, sample = next(iter(self._samples.items()))
+            if sample[0] >= cutoff:
+                break
+            del self._samples[key]
+            removed += 1
+        return removed
@@ -0,0 +1,177 @@
+"""Состояние связи с устройствами: circuit breaker и адаптивные таймауты.
+
+Для каждого протокола опроса (icmp, snmp) и устройства хранится:
+число неудач подряд, состояние предохранителя и последние времена
+ответа. После failure_threshold неудач подряд предохранитель
+размыкается (open): устройство не опрашивается до open_until, а
+интервал до пробного опроса удваивается с каждым размыканием
+(base_backoff, 2 * base_backoff, ... до max_backoff). Пробный опрос
+(half_open) выполняется одной попыткой без повторов; ответ замыкает
+предохранитель, неудача размыкает его снова.
+
+Таймаут запроса к устройству - p95 его последних времён ответа,
+умноженный на timeout_factor и ограниченный снизу min_timeout, а
+сверху - таймаутом по умолчанию. Пока ответов мало, используется
+таймаут по умолчанию.
+
+Состояние всех устройств протокола хранится в одном hash Redis
+(health:{протокол}, поле - IP, значение - JSON) и общее для всех
+процессов воркеров.
+"""
+import json
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def describe(entry: Optional[Dict], now: Optional[float] = None) -> Dict:
+    """Состояние предохранителя устройства для ответа API"""
+    now = time.time() if now is None else now
+    entry = entry or {}
+    open_until = entry.get('open_until')
+    if open_until is None:
+        state = STATE_CLOSED
+    elif now < open_until:
+        state = STATE_OPEN
+    else:
+        state = STATE_HALF_OPEN
+    samples = entry.get('rtt') or []
+    return {
+        'state': state,
+        'failures': entry.get('failures', 0),
+        'opened': entry.get('opens', 0),
+        'retry_at': open_until if state == STATE_OPEN else None,
+        'rtt_p95_ms': percentile(samples, 0.95) * 1000 if samples else None,
+    }
+
+
+class HealthTracker:
+    """Предохранители и таймауты опроса устройств по одному протоколу"""
+
+    def __init__(self, redis_client, protocol: str, default_timeout: float, default_retries: int,
+                 failure_threshold: int = 3, base_backoff: float = 600.0, max_backoff: float = 3600.0,
+                 min_timeout: float = 0.5, timeout_factor: float = 4.0, min_samples: int = 5,
+                 window: int = 20, async_client=None, prefix: str = "health"):
+        self.redis = redis_client
+        self.async_redis = async_client
+        self.protocol = protocol
+        self.default_timeout = default_timeout
+        self.default_retries = default_retries
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.min_timeout = min_timeout
+        self.timeout_factor = timeout_factor
+        self.min_samples = min_samples
+        self.window = window
+        self.key = f"{prefix}:{protocol}"
+
+    @staticmethod
+    def _decode(values) -> List[Dict]:
+        return [json.loads(value) if value else {} for value in values]
+
+    def load(self, device_ips: List[str]) -> Dict[str, Dict]:
+        if not device_ips:
+            return {}
+        try:
+            values = self.redis.hmget(self.key, device_ips)
+        except Exception as e:
+            # Без состояния опрос идёт как раньше: все устройства, таймауты по умолчанию
+            logger.warning(f"Failed to load {self.protocol} health of {len(device_ips)} devices: {e}")
+            values = [None] * len(device_ips)
+        return dict(zip(device_ips, self._decode(values)))
+
+    async def load_async(self, device_ips: List[str]) -> Dict[str, Dict]:
+        """Чтение состояния из обработчиков API (клиент redis.asyncio)"""
+        if not device_ips:
+            return {}
+        return dict(zip(device_ips, self._decode(await self.async_redis.hmget(self.key, device_ips))))
+
+    async def load_all_async(self) -> Dict[str, Dict]:
+        entries = await self.async_redis.hgetall(self.key)
+        return {
+            (ip.decode() if isinstance(ip, bytes) else ip): json.loads(value)
+            for ip, value in entries.items()
+        }
+
+    def timeout(self, entry: Dict) -> float:
+        samples = entry.get('rtt') or []
+        if len(samples) < self.min_samples:
+            return self.default_timeout
+        return min(self.default_timeout, max(self.min_timeout, percentile(samples, 0.95) * self.timeout_factor))
+
+    def plan(self, device_ips: Iterable[str], force: bool = False,
+             now: Optional[float] = None) -> Tuple[Dict[str, Tuple[float, int]], Dict[str, float]]:
+        """Разделение пакета на опрашиваемые и пропускаемые устройства.
+
+        Возвращает ({IP: (таймаут, повторы)} для опроса, {IP: open_until}
+        для устройств с разомкнутым предохранителем). force - опросить
+        все устройства (ручная проверка), пробным запросом для разомкнутых.
+        """
+        now = time.time() if now is None else now
+        probes, skipped = {}, {}
+        for device_ip, entry in self.load(list(device_ips)).items():
+            open_until = entry.get('open_until')
+            if open_until is not None and now < open_until and not force:
+                skipped[device_ip] = open_until
+                continue
+            # Пробный запрос к разомкнутому устройству - одна попытка
+            retries = 0 if open_until is not None else self.default_retries
+            probes[device_ip] = (self.timeout(entry), retries)
+        return probes, skipped
+
+    def record(self, results: Dict[str, Optional[float]], now: Optional[float] = None) -> Dict[str, str]:
+        """Учёт результатов опроса (IP -> время ответа в секундах или None).
+
+        Возвращает переходы предохранителей: {IP: новое состояние}.
+        """
+        if not results:
+            return {}
+        now = time.time() if now is None else now
+        entries = self.load(list(results))
+        updates, transitions = {}, {}
+
+        for device_ip, response_time in results.items():
+            entry = entries.get(device_ip) or {}
+            was_open = entry.get('open_until') is not None
+            if response_time is not None:
+                samples = (entry.get('rtt') or []) + [round(response_time, 6)]
+                entry = {'failures': 0, 'opens': 0, 'open_until': None, 'rtt': samples[-self.window:]}
+                if was_open:
+                    transitions[device_ip] = STATE_CLOSED
+            else:
+                entry['failures'] = entry.get('failures', 0) + 1
+                if was_open or entry['failures'] >= self.failure_threshold:
+                    opens = entry.get('opens', 0) + 1
+                    backoff = min(self.base_backoff * 2 ** min(opens - 1, 20), self.max_backoff)
+                    entry.update(opens=opens, open_until=now + backoff)
+                    if not was_open:
+                        transitions[device_ip] = STATE_OPEN
+            updates[device_ip] = json.dumps(entry)
+
+        try:
+            self.redis.hset(self.key, mapping=updates)
+        except Exception as e:
+            logger.warning(f"Failed to save {self.protocol} health of {len(updates)} devices: {e}")
+        return transitions
+
+    def retain(self, device_ips: Iterable[str]):
+        """Удаление состояния устройств, исключённых из инвентаря"""
+        wanted = set(device_ips)
+        removed = [
+            ip for ip in (key.decode() if isinstance(key, bytes) else key for key in self.redis.hkeys(self.key))
+            if ip not in wanted
+        ]
+        if removed:
+            self.redis.hdel(self.key, *removed)
@@ -0,0 +1,203 @@
+import asyncio
+import itertools
+import logging
+import os
+import socket
+import struct
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+
+_instance_ids = itertools.count()
+
+
+def checksum(data: bytes) -> int:
+    """Контрольная сумма ICMP (RFC 1071)"""
+    if len(data) % 2:
+        data += b'\x00'
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def build_echo_request(identifier: int, sequence: int, payload: bytes = b'') -> bytes:
+    """Сборка ICMP Echo Request"""
+    header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, 0, identifier, sequence)
+    csum = checksum(header + payload)
+    return struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, csum, identifier, sequence) + payload
+
+
+class ICMPPinger:
+    """Асинхронный ICMP ping множества узлов через один сокет.
+
+    Запросы ко всем узлам отправляются из одного сокета, ответы
+    читаются обработчиком event loop и сопоставляются с запросами по
+    (адрес, identifier, sequence). Для каждого узла выполняется до
+    retries + 1 попыток с таймаутом timeout секунд на попытку.
+
+    Используется raw-сокет (нужен CAP_NET_RAW), при его недоступности -
+    непривилегированный ICMP datagram-сокет Linux. В последнем случае
+    identifier назначает ядро, и сопоставление идёт по sequence.
+    """
+
+    def __init__(self, timeout: float = 2.0, retries: int = 1, rate: int = 5000,
+                 sock: Optional[socket.socket] = None, payload: bytes = b'network-monitoring'):
+        self.timeout = timeout
+        self.retries = retries
+        # Ограничение скорости отправки, пакетов в секунду
+        self.rate = rate
+        self.payload = payload
+        self._sock = sock
+        self._identifier = (os.getpid() + next(_instance_ids)) & 0xFFFF
+        self._sequence = itertools.count()
+        self._pending: Dict[Tuple[str, int], Tuple[asyncio.Future, float]] = {}
+        self._reader_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _open_socket(self) -> socket.socket:
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+        except PermissionError:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+        sock.setblocking(False)
+        # Ответы тысяч узлов приходят почти одновременно
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        return sock
+
+    @property
+    def sock(self) -> socket.socket:
+        if self._sock is None:
+            self._sock = self._open_socket()
+        return self._sock
+
+    @property
+    def _kernel_identifier(self) -> bool:
+        """Для datagram-сокета identifier подставляет ядро"""
+        return self.sock.type == socket.SOCK_DGRAM
+
+    def _address(self, host: str) -> tuple:
+        return host, 0
+
+    def _parse_reply(self, data: bytes, address: tuple) -> Optional[Tuple[str, int, int]]:
+        """Разбор ответа: (адрес, identifier, sequence) или None"""
+        if self.sock.type == socket.SOCK_RAW:
+            # Raw-сокет IPv4 получает пакет вместе с IP-заголовком
+            data = data[(data[0] & 0x0F) * 4:]
+        if len(data) < 8:
+            return None
+        icmp_type, _, _, identifier, sequence = struct.unpack("!BBHHH", data[:8])
+        if icmp_type != ICMP_ECHO_REPLY:
+            return None
+        return address[0], identifier, sequence
+
+    def _on_readable(self):
+        now = time.perf_counter()
+        while True:
+            try:
+                data, address = self.sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                logger.debug(f"ICMP receive error: {e}")
+                return
+
+            reply = self._parse_reply(data, address)
+            if reply is None:
+                continue
+            host, identifier, sequence = reply
+            if not self._kernel_identifier and identifier != self._identifier:
+                # Ответ на чужой запрос (raw-сокет видит весь ICMP-трафик узла)
+                continue
+            pending = self._pending.pop((host, sequence), None)
+            if pending is None:
+                continue
+            future, sent_at = pending
+            if not future.done():
+                future.set_result(now - sent_at)
+
+    def _ensure_reader(self):
+        loop = asyncio.get_event_loop()
+        if self._reader_loop is not loop:
+            if self._reader_loop is not None and not self._reader_loop.is_closed():
+                self._reader_loop.remove_reader(self.sock.fileno())
+            loop.add_reader(self.sock.fileno(), self._on_readable)
+            self._reader_loop = loop
+
+    async def _send(self, host: str, sequence: int):
+        packet = build_echo_request(self._identifier, sequence, self.payload)
+        while True:
+            try:
+                self.sock.sendto(packet, self._address(host))
+                return
+            except (BlockingIOError, InterruptedError):
+                # Буфер отправки заполнен - даём ядру время
+                await asyncio.sleep(0.001)
+
+    async def _probe(self, host: str, throttle, timeout: float, retries: int) -> Optional[float]:
+        loop = asyncio.get_event_loop()
+        for _ in range(retries + 1):
+            sequence = next(self._sequence) & 0xFFFF
+            future = loop.create_future()
+            await throttle()
+            self._pending[(host, sequence)] = (future, time.perf_counter())
+            try:
+                await self._send(host, sequence)
+            except OSError as e:
+                # Например, сеть недоступна - повтор не поможет
+                logger.debug(f"ICMP send to {host} failed: {e}")
+                self._pending.pop((host, sequence), None)
+                return None
+            try:
+                return await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                self._pending.pop((host, sequence), None)
+        return None
+
+    def _throttle(self):
+        """Ограничитель скорости отправки (token bucket)"""
+        interval = 1.0 / self.rate if self.rate else 0.0
+        state = {'next': time.perf_counter()}
+
+        async def wait():
+            if not interval:
+                return
+            now = time.perf_counter()
+            scheduled = max(state['next'], now)
+            state['next'] = scheduled + interval
+            if scheduled - now > 0.005:
+                await asyncio.sleep(scheduled - now)
+
+        return wait
+
+    async def ping_many(self, hosts: Iterable[str],
+                        limits: Optional[Dict[str, Tuple[float, int]]] = None) -> Dict[str, Optional[float]]:
+        """Ping списка узлов. Возвращает {адрес: RTT в секундах или None}.
+
+        limits - (таймаут, повторы) для отдельных узлов вместо общих.
+        """
+        hosts = list(dict.fromkeys(hosts))
+        if not hosts:
+            return {}
+        limits = limits or {}
+        self._ensure_reader()
+        throttle = self._throttle()
+        results = await asyncio.gather(*[
+            self._probe(host, throttle, *limits.get(host, (self.timeout, self.retries))) for host in hosts
+        ])
+        return dict(zip(hosts, results))
+
+    async def ping(self, host: str) -> Optional[float]:
+        """Ping одного узла"""
+        return (await self.ping_many([host]))[host]
+
+    def close(self):
+        if self._sock is not None:
+            if self._reader_loop is not None and not self._reader_loop.is_closed():
+                self._reader_loop.remove_reader(self._sock.fileno())
+            self._reader_loop = None
+            self._sock.close()
+            self._sock = None
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Float, Text
+from sqlalchemy import Column, Integer, BigInteger, String, Date, DateTime, Boolean, Float, Text, Index, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 
@@ -6,14 +6,45 @@ Base = declarative_base()
 
 class DeviceMetric(Base):
     __tablename__ = "device_metrics"
+    __table_args__ = (
+        Index('ix_device_metrics_device_metric_ts', 'device_ip', 'metric_name', 'timestamp'),
+        # Time-range scans of the rollup job; rows arrive in time order, so BRIN stays tiny
+        Index('ix_device_metrics_timestamp', 'timestamp', postgresql_using='brin'),
+        # Daily range partitions are created and dropped by app.timeseries
+        {'postgresql_partition_by': 'RANGE (timestamp)'},
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
-    device_ip = Column(String(15), nullable=False, index=True)
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    device_ip = Column(String(15), nullable=False)
     metric_type = Column(String(50), nullable=False)  # cpu, memory, interface, availability
     metric_name = Column(String(100), nullable=False)  # cpu_usage, memory_used, etc.
     metric_value = Column(Float, nullable=False)
     unit = Column(String(20), nullable=True)  # %, MB, Mbps, etc.
-    timestamp = Column(DateTime, default=func.now())
+    timestamp = Column(DateTime, primary_key=True, default=func.now())
+
+class MetricRollupMixin:
+    device_ip = Column(String(15), primary_key=True)
+    metric_name = Column(String(100), primary_key=True)
+    bucket = Column(DateTime, primary_key=True)  # start of the aggregation interval
+    min_value = Column(Float, nullable=False)
+    max_value = Column(Float, nullable=False)
+    avg_value = Column(Float, nullable=False)
+    p95_value = Column(Float, nullable=True)  # hourly rollups keep the max of minute p95 (upper bound)
+    sum_value = Column(Float, nullable=False)
+    sample_count = Column(Integer, nullable=False)
+
+class DeviceMetricRollup1m(MetricRollupMixin, Base):
+    __tablename__ = "device_metrics_1m"
+    __table_args__ = (
+        Index('ix_device_metrics_1m_bucket', 'bucket', postgresql_using='brin'),
+        {'postgresql_partition_by': 'RANGE (bucket)'},
+    )
+
+class DeviceMetricRollup1h(MetricRollupMixin, Base):
+    __tablename__ = "device_metrics_1h"
+    __table_args__ = (
+        Index('ix_device_metrics_1h_bucket', 'bucket'),
+    )
 
 class DeviceStatus(Base):
     __tablename__ = "device_status"
@@ -24,6 +55,32 @@ class DeviceStatus(Base):
     response_time = Column(Float)  # in ms
     last_check = Column(DateTime, default=func.now())
     uptime = Column(Float, default=0.0)  # in seconds
+    up_since = Column(DateTime, nullable=True)  # start of the current up interval
+
+class AvailabilityInterval(Base):
+    """Up/down intervals of a device; written only when the state changes"""
+    __tablename__ = "availability_intervals"
+    __table_args__ = (
+        Index('ix_availability_intervals_device_started', 'device_ip', 'started_at'),
+        # At most one open (current) interval per device
+        Index('ix_availability_intervals_open', 'device_ip', unique=True,
+              postgresql_where=text('ended_at IS NULL')),
+    )
+
+    id = Column(BigInteger, primary_key=True)
+    device_ip = Column(String(15), nullable=False)
+    is_up = Column(Boolean, nullable=False)
+    started_at = Column(DateTime, nullable=False)
+    ended_at = Column(DateTime, nullable=True)  # NULL - current state
+
+class AvailabilityDaily(Base):
+    """Up/down seconds of closed intervals per device and day"""
+    __tablename__ = "availability_daily"
+
+    device_ip = Column(String(15), primary_key=True)
+    day = Column(Date, primary_key=True, index=True)
+    up_seconds = Column(Float, nullable=False, default=0.0)
+    down_seconds = Column(Float, nullable=False, default=0.0)
 
 class InterfaceStatus(Base):
     __tablename__ = "interface_status"
@@ -35,4 +92,29 @@ class InterfaceStatus(Base):
     oper_status = Column(String(20), nullable=True)   # up, down
     bandwidth_usage = Column(Float, nullable=True)    # in Mbps
     error_count = Column(Integer, default=0)
-    timestamp = Column(DateTime, default=func.now())
\ No newline at end of file
+    timestamp = Column(DateTime, default=func.now())
+
+class Alert(Base):
+    """Threshold, anomaly and flapping alerts raised by app.alerts"""
+    __tablename__ = "alerts"
+    __table_args__ = (
+        # At most one open alert of a kind per device metric (deduplication)
+        Index('ix_alerts_open', 'device_ip', 'metric', 'target', 'kind', unique=True,
+              postgresql_where=text('resolved_at IS NULL')),
+        Index('ix_alerts_device_started', 'device_ip', 'started_at'),
+    )
+
+    id = Column(BigInteger, primary_key=True)
+    device_ip = Column(String(15), nullable=False)
+    metric = Column(String(50), nullable=False)
+    target = Column(String(64), nullable=False, default='')  # interface name, '' for device metrics
+    kind = Column(String(20), nullable=False)  # threshold, anomaly, flapping
+    severity = Column(String(20), nullable=False)
+    state = Column(String(20), nullable=False)  # firing, resolved
+    value = Column(Float)
+    threshold = Column(Float)
+    message = Column(Text)
+    started_at = Column(DateTime, nullable=False)
+    resolved_at = Column(DateTime, nullable=True)
+    acknowledged_at = Column(DateTime, nullable=True)
+    acknowledged_by = Column(String(50), nullable=True)
@@ -0,0 +1,155 @@
+import json
+import logging
+import math
+import time
+import urllib.parse
+import urllib.request
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class PollScheduler:
+    """Планировщик опроса парка устройств.
+
+    Время следующего опроса каждого устройства хранится в Redis
+    (sorted set, score - unix-время). Стартовая фаза устройства
+    вычисляется из хеша IP, поэтому опросы равномерно распределены
+    по интервалу. Интервал каждого устройства подстраивается под
+    его время отклика и число неудачных опросов подряд.
+    """
+
+    def __init__(self, redis_client, name: str, interval: float, batch_size: int = 500,
+                 max_interval: Optional[float] = None, slow_rtt_ms: float = 500.0):
+        self.redis = redis_client
+        self.name = name
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_interval = max_interval or interval * 8
+        self.slow_rtt_ms = slow_rtt_ms
+
+        self.due_key = f"poll:{name}:due"
+        self.state_key = f"poll:{name}:failures"
+
+    def phase(self, device_ip: str) -> float:
+        """Стабильное смещение устройства внутри интервала"""
+        return zlib.crc32(device_ip.encode()) % 1000000 / 1000000 * self.interval
+
+    def sync_inventory(self, device_ips: Iterable[str], now: Optional[float] = None) -> Tuple[int, int]:
+        """Синхронизация расписания с инвентарём: новые устройства добавляются, удалённые - исключаются"""
+        now = time.time() if now is None else now
+        wanted = set(device_ips)
+        scheduled = {ip.decode() if isinstance(ip, bytes) else ip
+                     for ip in self.redis.zrange(self.due_key, 0, -1)}
+
+        added = wanted - scheduled
+        removed = scheduled - wanted
+
+        pipe = self.redis.pipeline(transaction=False)
+        if added:
+            # Первый опрос - в ближайшую "свою" точку интервала
+            base = now - now % self.interval
+            mapping = {}
+            for ip in added:
+                due = base + self.phase(ip)
+                mapping[ip] = due if due >= now else due + self.interval
+            pipe.zadd(self.due_key, mapping)
+        if removed:
+            pipe.zrem(self.due_key, *removed)
+            pipe.hdel(self.state_key, *removed)
+        pipe.execute()
+
+        return len(added), len(removed)
+
+    def take_due(self, horizon: float, now: Optional[float] = None) -> List[List[Tuple[str, float]]]:
+        """Выборка устройств, опрос которых наступает в ближайшие horizon секунд, разбитых на пакеты.
+
+        Выбранные устройства сразу переносятся на интервал вперёд, чтобы
+        не попасть в следующую выборку, если пакет потеряется. После
+        опроса время пересчитывается в record().
+        """
+        now = time.time() if now is None else now
+        entries = self.redis.zrangebyscore(self.due_key, "-inf", now + horizon, withscores=True)
+        if not entries:
+            return []
+
+        due = [(ip.decode() if isinstance(ip, bytes) else ip, score) for ip, score in entries]
+        self.redis.zadd(self.due_key, {ip: max(score, now) + self.max_interval for ip, score in due})
+
+        return [due[i:i + self.batch_size] for i in range(0, len(due), self.batch_size)]
+
+    def next_interval(self, response_time: Optional[float], failures: int) -> float:
+        """Интервал до следующего опроса с учётом медленных и нестабильных устройств"""
+        if failures:
+            return min(self.interval * 2 ** min(failures, 10), self.max_interval)
+        if response_time is not None and response_time > self.slow_rtt_ms:
+            return min(self.interval * 2, self.max_interval)
+        return self.interval
+
+    def record(self, results: Dict[str, Optional[float]], due_times: Optional[Dict[str, float]] = None,
+               now: Optional[float] = None, deferred: Optional[Dict[str, float]] = None):
+        """Планирование следующего опроса по результатам (IP -> время отклика в мс или None).
+
+        deferred - устройства, не опрошенные из-за предохранителя: следующий
+        опрос назначается на время пробного запроса, счётчик неудач не меняется.
+        """
+        if not results and not deferred:
+            return
+        now = time.time() if now is None else now
+        due_times = due_times or {}
+        ips = list(results)
+        failures = dict(zip(ips, self.redis.hmget(self.state_key, ips))) if ips else {}
+
+        schedule = {}
+        failed = {}
+        recovered = []
+        for ip, response_time in results.items():
+            count = int(failures.get(ip) or 0)
+            if response_time is None:
+                count += 1
+                failed[ip] = count
+            elif count:
+                count = 0
+                recovered.append(ip)
+
+            # Отсчёт от планового времени сохраняет фазу устройства,
+            # и опросы не собираются со временем в одну секунду
+            interval = self.next_interval(response_time, count)
+            next_due = due_times.get(ip, now) + interval
+            if next_due < now:
+                next_due += math.ceil((now - next_due) / interval) * interval
+            schedule[ip] = next_due
+        for ip, retry_at in (deferred or {}).items():
+            schedule[ip] = max(retry_at, now)
+
+        pipe = self.redis.pipeline(transaction=False)
+        # XX - не возвращать устройства, удалённые из инвентаря за время опроса
+        pipe.zadd(self.due_key, schedule, xx=True)
+        if failed:
+            pipe.hset(self.state_key, mapping=failed)
+        if recovered:
+            pipe.hdel(self.state_key, *recovered)
+        pipe.execute()
+
+
+def load_inventory(discovery_url: str, page_size: int = 5000) -> Optional[Dict[str, str]]:
+    """Активные устройства из discovery-service: {IP: класс устройства} (None - инвентарь недоступен)"""
+    inventory = {}
+    cursor = None
+    while True:
+        params = {'limit': page_size}
+        if cursor:
+            params['cursor'] = cursor
+        url = f"{discovery_url.rstrip('/')}/devices?{urllib.parse.urlencode(params)}"
+        try:
+            with urllib.request.urlopen(url, timeout=30) as response:
+                page = json.load(response)
+        except Exception as e:
+            logger.error(f"Failed to load device inventory from {discovery_url}: {e}")
+            return None
+        for device in page['items']:
+            inventory[device['ip_address']] = device.get('device_type') or 'unknown'
+        cursor = page.get('next_cursor')
+        if not cursor:
+            return inventory
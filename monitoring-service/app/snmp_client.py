@@ -1,16 +1,89 @@
-from pysnmp.hlapi import *
+import asyncio
 import logging
-from typing import Dict, List, Optional
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from pysnmp.hlapi.asyncio import (
+    CommunityData,
+    ContextData,
+    ObjectIdentity,
+    ObjectType,
+    SnmpEngine,
+    UdpTransportTarget,
+    bulkCmd,
+    getCmd,
+)
+from pysnmp.proto.errind import RequestTimedOut
+from pysnmp.proto.rfc1902 import OctetString
+from pysnmp.proto.rfc1905 import EndOfMibView, NoSuchInstance, NoSuchObject
+
+from .counters import CounterStore
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Значения, которыми агент SNMPv2c сообщает об отсутствии переменной
+_EMPTY_VALUES = (NoSuchObject, NoSuchInstance, EndOfMibView)
+
+# Колонки ifTable/ifXTable, обходимые при сборе метрик интерфейсов
+IF_COLUMNS = {
+    'descr': (1, 3, 6, 1, 2, 1, 2, 2, 1, 2),
+    'admin_status': (1, 3, 6, 1, 2, 1, 2, 2, 1, 7),
+    'oper_status': (1, 3, 6, 1, 2, 1, 2, 2, 1, 8),
+    'in_octets': (1, 3, 6, 1, 2, 1, 2, 2, 1, 10),
+    'in_errors': (1, 3, 6, 1, 2, 1, 2, 2, 1, 14),
+    'out_octets': (1, 3, 6, 1, 2, 1, 2, 2, 1, 16),
+    'hc_in_octets': (1, 3, 6, 1, 2, 1, 31, 1, 1, 1, 6),
+    'hc_out_octets': (1, 3, 6, 1, 2, 1, 31, 1, 1, 1, 10),
+}
+
+# ipNetToMediaTable (ARP-кеш): индекс строки - ifIndex.a.b.c.d
+ARP_COLUMNS = {
+    'phys_address': (1, 3, 6, 1, 2, 1, 4, 22, 1, 2),
+    'type': (1, 3, 6, 1, 2, 1, 4, 22, 1, 4),
+}
+ARP_TYPE_DYNAMIC = '3'
+
+IF_STATUS = {
+    '1': 'up',
+    '2': 'down',
+    '3': 'testing',
+    '4': 'unknown',
+    '5': 'dormant',
+    '6': 'notPresent',
+    '7': 'lowerLayerDown',
+}
+
+
+def _hex_value(value) -> str:
+    """OCTET STRING (например, MAC-адрес) в hex, остальные значения - строкой"""
+    return value.asOctets().hex() if isinstance(value, OctetString) else str(value)
+
+
 class SNMPClient:
-    def __init__(self, community: str = "public", timeout: int = 2, retries: int = 1):
+    def __init__(self, community: str = "public", timeout: int = 2, retries: int = 1,
+                 max_in_flight: int = 200, max_oids_per_pdu: int = 32, max_repetitions: int = 25,
+                 counter_store: Optional[CounterStore] = None,
+                 observer: Optional[Callable[[str, float, Optional[str]], None]] = None, port: int = 161):
         self.community = community
+        # UDP-порт агентов (нестандартный - для имитации агентов в нагрузочных тестах)
+        self.port = port
         self.timeout = timeout
         self.retries = retries
-        
+        # Максимальное число одновременных запросов к устройствам
+        self.max_in_flight = max_in_flight
+        # Сколько переменных упаковывается в один GET PDU
+        self.max_oids_per_pdu = max_oids_per_pdu
+        # Сколько строк таблицы запрашивается одним GETBULK
+        self.max_repetitions = max_repetitions
+        # Предыдущие значения счётчиков интерфейсов для расчёта скорости
+        self.counters = counter_store or CounterStore()
+        # Вызывается после каждого запроса: (адрес, время ответа в секундах,
+        # None при ответе агента или причина неудачи - 'timeout' / 'error')
+        self.observer = observer
+        # (таймаут, повторы) отдельных устройств вместо общих - задаётся перед опросом пакета
+        self.limits: Dict[str, Tuple[float, int]] = {}
+
         # OID definitions
         self.OIDS = {
             'sys_descr': '1.3.6.1.2.1.1.1.0',
@@ -21,55 +94,270 @@ class SNMPClient:
             'memory_free': '1.3.6.1.4.1.9.9.48.1.1.1.6.1',  # Cisco memory
         }
 
-    def get_snmp_data(self, device_ip: str, oids: List[str]) -> Dict:
-        """Получение данных по SNMP"""
-        results = {}
-        
-        for oid in oids:
+        # SNMP-движок привязан к event loop, поэтому храним пару (loop, engine)
+        self._engine: Optional[SnmpEngine] = None
+        self._engine_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._auth = CommunityData(self.community)
+        self._context = ContextData()
+        # Собственный event loop для синхронных вызовов (Celery-воркеры)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_engine(self) -> SnmpEngine:
+        """Один SNMP-движок и UDP-транспорт на event loop"""
+        loop = asyncio.get_event_loop()
+        if self._engine is None or self._engine_loop is not loop:
+            self._engine = SnmpEngine()
+            self._engine_loop = loop
+        return self._engine
+
+    def _run(self, coro):
+        """Выполнение корутины из синхронного кода на постоянном event loop"""
+        if self._loop is None or self._loop.is_closed():
+            self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        return self._loop.run_until_complete(coro)
+
+    def _target(self, device_ip: str) -> UdpTransportTarget:
+        timeout, retries = self.limits.get(device_ip, (self.timeout, self.retries))
+        return UdpTransportTarget((device_ip, self.port), timeout=timeout, retries=retries)
+
+    def _observe(self, device_ip: str, started: float, error_indication=None, failed: bool = False):
+        if self.observer is None:
+            return
+        if failed or error_indication:
+            failure = 'timeout' if isinstance(error_indication, RequestTimedOut) else 'error'
+        else:
+            failure = None
+        self.observer(device_ip, time.perf_counter() - started, failure)
+
+    async def async_get(self, device_ip: str, oids: List[str]) -> Dict[str, Optional[str]]:
+        """Получение нескольких OID за один GET-запрос"""
+        results: Dict[str, Optional[str]] = {oid: None for oid in oids}
+        if not oids:
+            return results
+
+        engine = self._get_engine()
+        target = self._target(device_ip)
+
+        for start in range(0, len(oids), self.max_oids_per_pdu):
+            chunk = oids[start:start + self.max_oids_per_pdu]
+            started = time.perf_counter()
             try:
-                error_indication, error_status, error_index, var_binds = next(
-                    getCmd(SnmpEngine(),
-                          CommunityData(self.community),
-                          UdpTransportTarget((device_ip, 161), timeout=self.timeout, retries=self.retries),
-                          ContextData(),
-                          ObjectType(ObjectIdentity(oid)))
+                error_indication, error_status, error_index, var_binds = await getCmd(
+                    engine, self._auth, target, self._context,
+                    *[ObjectType(ObjectIdentity(oid)) for oid in chunk],
+                    lookupMib=False
                 )
-
-                if error_indication:
-                    logger.warning(f"SNMP error for {device_ip} OID {oid}: {error_indication}")
-                    results[oid] = None
-                elif error_status:
-                    logger.warning(f"SNMP error for {device_ip} OID {oid}: {error_status}")
-                    results[oid] = None
-                else:
-                    for var_bind in var_binds:
-                        results[oid] = str(var_bind[1])
-                        
             except Exception as e:
-                logger.error(f"SNMP exception for {device_ip} OID {oid}: {e}")
-                results[oid] = None
-        
+                logger.error(f"SNMP exception for {device_ip}: {e}")
+                self._observe(device_ip, started, failed=True)
+                continue
+            self._observe(device_ip, started, error_indication)
+
+            if error_indication:
+                logger.warning(f"SNMP error for {device_ip}: {error_indication}")
+                # Устройство не ответило - нет смысла ждать таймаут на остальных PDU
+                break
+            if error_status:
+                logger.warning(f"SNMP error for {device_ip}: {error_status.prettyPrint()} at {error_index}")
+                continue
+
+            for oid, (_, value) in zip(chunk, var_binds):
+                if not isinstance(value, _EMPTY_VALUES):
+                    results[oid] = str(value)
+
         return results
 
-    def get_device_metrics(self, device_ip: str) -> Dict:
-        """Получение метрик устройства"""
+    async def async_walk(self, device_ip: str, columns: Dict[str, tuple], full_index: bool = False,
+                         convert: Callable = str) -> Dict[str, Dict]:
+        """Обход колонок таблицы запросами GETBULK.
+
+        Все колонки обходятся параллельно в одном PDU, возвращается
+        {колонка: {индекс строки: значение}}. Индекс - последний
+        компонент OID, при full_index - кортеж всех компонентов после
+        OID колонки (составные индексы). Значения приводятся convert.
+        """
+        table: Dict[str, Dict[int, str]] = {name: {} for name in columns}
+        cursors = {name: oid for name, oid in columns.items()}
+
+        engine = self._get_engine()
+        target = self._target(device_ip)
+
+        while cursors:
+            names = list(cursors)
+            started = time.perf_counter()
+            try:
+                error_indication, error_status, error_index, var_bind_table = await bulkCmd(
+                    engine, self._auth, target, self._context,
+                    0, self.max_repetitions,
+                    *[ObjectType(ObjectIdentity(cursors[name])) for name in names],
+                    lookupMib=False
+                )
+            except Exception as e:
+                logger.error(f"SNMP walk exception for {device_ip}: {e}")
+                self._observe(device_ip, started, failed=True)
+                break
+            self._observe(device_ip, started, error_indication)
+
+            if error_indication:
+                logger.warning(f"SNMP walk error for {device_ip}: {error_indication}")
+                break
+            if error_status:
+                logger.warning(f"SNMP walk error for {device_ip}: {error_status.prettyPrint()} at {error_index}")
+                break
+
+            finished = set()
+            for row in var_bind_table:
+                for name, (oid, value) in zip(names, row):
+                    if name in finished:
+                        continue
+                    base = columns[name]
+                    oid = tuple(oid)
+                    if isinstance(value, _EMPTY_VALUES) or oid[:len(base)] != base or oid <= tuple(cursors[name]):
+                        # Колонка закончилась (или агент вернул OID не по порядку)
+                        finished.add(name)
+                        continue
+                    index = oid[len(base):] if full_index else oid[-1]
+                    table[name][index] = convert(value)
+                    cursors[name] = oid
+
+            if not var_bind_table:
+                break
+            for name in finished:
+                cursors.pop(name, None)
+
+        return table
+
+    async def async_get_interface_metrics(self, device_ip: str) -> List[Dict]:
+        """Сбор метрик всех интерфейсов устройства обходом ifTable/ifXTable"""
+        table = await self.async_walk(device_ip, IF_COLUMNS)
+        now = time.time()
+
+        interfaces = []
+        for if_index in sorted(set(table['descr']) | set(table['oper_status'])):
+            hc_in = table['hc_in_octets'].get(if_index)
+            hc_out = table['hc_out_octets'].get(if_index)
+            if hc_in is not None and hc_out is not None:
+                in_octets, out_octets, bits = hc_in, hc_out, 64
+            else:
+                in_octets, out_octets, bits = table['in_octets'].get(if_index), table['out_octets'].get(if_index), 32
+
+            # После неполного обхода счётчика нет: ноль вместо него выглядел бы
+            # как переполнение Counter32. Прежнее значение остаётся для следующего опроса
+            in_bps = out_bps = None
+            if in_octets is not None and out_octets is not None:
+                in_bps, out_bps = self.counters.update(device_ip, if_index, int(in_octets), int(out_octets),
+                                                       bits, now)
+            bandwidth = None
+            if in_bps is not None and out_bps is not None:
+                bandwidth = (in_bps + out_bps) / 1_000_000
+
+            interfaces.append({
+                'if_index': if_index,
+                'interface_name': table['descr'].get(if_index) or f"if{if_index}",
+                'admin_status': IF_STATUS.get(table['admin_status'].get(if_index), 'unknown'),
+                'oper_status': IF_STATUS.get(table['oper_status'].get(if_index), 'unknown'),
+                'bandwidth_usage': bandwidth,  # Mbps, вход + выход
+                'in_mbps': in_bps / 1_000_000 if in_bps is not None else None,
+                'out_mbps': out_bps / 1_000_000 if out_bps is not None else None,
+                'error_count': int(table['in_errors'].get(if_index, 0)),
+            })
+
+        return interfaces
+
+    async def async_get_arp_table(self, device_ip: str) -> List[Dict]:
+        """Динамические записи ARP-кеша устройства: [{'ip': ..., 'mac': ...}]"""
+        table = await self.async_walk(device_ip, ARP_COLUMNS, full_index=True, convert=_hex_value)
+        entries = []
+        for index, mac in table['phys_address'].items():
+            if len(index) < 5 or table['type'].get(index) != ARP_TYPE_DYNAMIC or len(mac) != 12:
+                continue
+            entries.append({
+                'ip': '.'.join(str(part) for part in index[-4:]),
+                'mac': ':'.join(mac[i:i + 2] for i in range(0, 12, 2)),
+            })
+        return entries
+
+    async def async_get_device_metrics(self, device_ip: str) -> Dict:
+        """Асинхронное получение метрик устройства"""
         oids_to_query = [
             self.OIDS['sys_name'],
+            self.OIDS['sys_uptime'],
             self.OIDS['cpu_usage'],
             self.OIDS['memory_used'],
             self.OIDS['memory_free']
         ]
-        
-        raw_data = self.get_snmp_data(device_ip, oids_to_query)
-        
-        # Обработка и преобразование данных
+
+        raw_data = await self.async_get(device_ip, oids_to_query)
+        return self._parse_device_metrics(raw_data)
+
+    async def _gather(self, device_ips: Iterable[str], poll_fn, default):
+        """Параллельный опрос множества устройств с ограничением числа запросов в полёте"""
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+
+        async def poll(ip: str):
+            async with semaphore:
+                try:
+                    return ip, await poll_fn(ip)
+                except Exception as e:
+                    logger.error(f"Error polling {ip}: {e}")
+                    return ip, default
+
+        results = await asyncio.gather(*[poll(ip) for ip in device_ips])
+        return dict(results)
+
+    async def poll_devices(self, device_ips: Iterable[str]) -> Dict[str, Dict]:
+        """Параллельный сбор системных метрик"""
+        return await self._gather(device_ips, self.async_get_device_metrics, {})
+
+    async def poll_interfaces(self, device_ips: Iterable[str]) -> Dict[str, List[Dict]]:
+        """Параллельный сбор метрик интерфейсов"""
+        results = await self._gather(device_ips, self.async_get_interface_metrics, [])
+        self.counters.prune()
+        return results
+
+    async def poll_arp_tables(self, device_ips: Iterable[str]) -> Dict[str, List[Dict]]:
+        """Параллельный сбор ARP-кешей"""
+        return await self._gather(device_ips, self.async_get_arp_table, [])
+
+    def get_devices_arp_tables(self, device_ips: Iterable[str]) -> Dict[str, List[Dict]]:
+        """Получение ARP-кешей пакета устройств"""
+        return self._run(self.poll_arp_tables(device_ips))
+
+    def get_snmp_data(self, device_ip: str, oids: List[str]) -> Dict:
+        """Получение данных по SNMP"""
+        return self._run(self.async_get(device_ip, oids))
+
+    def get_device_metrics(self, device_ip: str) -> Dict:
+        """Получение метрик устройства"""
+        return self._run(self.async_get_device_metrics(device_ip))
+
+    def get_devices_metrics(self, device_ips: Iterable[str]) -> Dict[str, Dict]:
+        """Получение метрик для пакета устройств"""
+        return self._run(self.poll_devices(device_ips))
+
+    def get_interface_metrics(self, device_ip: str) -> List[Dict]:
+        """Получение метрик интерфейсов"""
+        return self._run(self.async_get_interface_metrics(device_ip))
+
+    def get_devices_interfaces(self, device_ips: Iterable[str]) -> Dict[str, List[Dict]]:
+        """Получение метрик интерфейсов для пакета устройств"""
+        return self._run(self.poll_interfaces(device_ips))
+
+    def _parse_device_metrics(self, raw_data: Dict) -> Dict:
+        """Обработка и преобразование данных"""
         metrics = {}
-        
+
+        # sysUpTime - TimeTicks, сотые доли секунды (переполняется через 497 дней)
+        sys_uptime = raw_data.get(self.OIDS['sys_uptime'])
+        if sys_uptime and sys_uptime.isdigit():
+            metrics['sys_uptime'] = int(sys_uptime) / 100
+
         # CPU usage
         cpu_usage = raw_data.get(self.OIDS['cpu_usage'])
         if cpu_usage and cpu_usage.isdigit():
             metrics['cpu_usage'] = float(cpu_usage)
-        
+
         # Memory usage
         memory_used = raw_data.get(self.OIDS['memory_used'])
         memory_free = raw_data.get(self.OIDS['memory_free'])
@@ -79,32 +367,5 @@ class SNMPClient:
                 metrics['memory_usage'] = (float(memory_used) / total_memory) * 100
                 metrics['memory_used_mb'] = float(memory_used) / 1024  # Convert to MB
                 metrics['memory_total_mb'] = total_memory / 1024
-        
-        return metrics
 
-    def get_interface_metrics(self, device_ip: str) -> List[Dict]:
-        """Получение метрик интерфейсов (упрощенная версия)"""
-        # В реальной системе здесь будет сложная логика опроса интерфейсов
-        interfaces = []
-        
-        try:
-            # Пример для одного интерфейса
-            interface_oids = [
-                '1.3.6.1.2.1.2.2.1.7.1',  # admin status
-                '1.3.6.1.2.1.2.2.1.8.1',  # oper status
-            ]
-            
-            raw_data = self.get_snmp_data(device_ip, interface_oids)
-            
-            interfaces.append({
-                'interface_name': 'GigabitEthernet0/0',
-                'admin_status': 'up' if raw_data.get(interface_oids[0]) == '1' else 'down',
-                'oper_status': 'up' if raw_data.get(interface_oids[1]) == '1' else 'down',
-                'bandwidth_usage': 45.2,  # Примерное значение
-                'error_count': 0
-            })
-            
-        except Exception as e:
-            logger.error(f"Error getting interface metrics for {device_ip}: {e}")
-        
-        return interfaces
\ No newline at end of file
+        return metrics
@@ -0,0 +1,102 @@
+"""Поток изменений состояния устройств для дашбордов (Server-Sent Events).
+
+Задачи опроса публикуют изменения в канал Redis pub/sub при записи в
+кеш (StatusCache). Каждая реплика сервиса держит одну подписку на канал
+(StatusStreamHub), объединяет изменения одного устройства за окно
+window секунд и рассылает их подключённым клиентам одним кадром SSE.
+Кадр update содержит только изменившиеся поля; в metrics - только
+изменившиеся значения (null - метрика пропала).
+Снимок при подключении читается из кеша, поэтому открытые дашборды не
+обращаются к базе.
+"""
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+def sse_event(event: str, data) -> bytes:
+    """Кадр Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+
+class StatusStreamHub:
+    """Подписка реплики на изменения и рассылка их клиентам"""
+
+    def __init__(self, async_client, channel: str, window: float = 1.0, client_queue_size: int = 64):
+        self.redis = async_client
+        self.channel = channel
+        self.window = window
+        self.client_queue_size = client_queue_size
+        self._clients: Set[asyncio.Queue] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def client_count(self) -> int:
+        return len(self._clients)
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.client_queue_size)
+        self._clients.add(queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._listen())
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._clients.discard(queue)
+
+    def _broadcast(self, frame: Optional[bytes]):
+        for queue in list(self._clients):
+            try:
+                queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                # Клиент не успевает читать - отключаем, EventSource
+                # переподключится и получит свежий снимок
+                self._clients.discard(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+                logger.info("Dropping slow status stream client")
+
+    async def _listen(self):
+        pubsub = self.redis.pubsub()
+        await pubsub.subscribe(self.channel)
+        pending: Dict[str, Dict] = {}
+        flush_at = time.monotonic() + self.window
+        try:
+            while True:
+                timeout = max(0.0, flush_at - time.monotonic())
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+                if message is not None and message.get('type') == 'message':
+                    try:
+                        updates = json.loads(message['data'])
+                    except ValueError:
+                        updates = []
+                    for update in updates:
+                        # Последующие изменения устройства дополняют предыдущие
+                        entry = pending.setdefault(update['device_ip'], {})
+                        if 'metrics' in update and 'metrics' in entry:
+                            update = dict(update, metrics={**entry['metrics'], **update['metrics']})
+                        entry.update(update)
+
+                if time.monotonic() >= flush_at:
+                    if pending and self._clients:
+                        self._broadcast(sse_event('update', list(pending.values())))
+                    pending = {}
+                    flush_at = time.monotonic() + self.window
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Status stream subscription failed: {e}")
+            # Клиенты переподключатся и заново запустят подписку
+            self._broadcast(None)
+            self._clients.clear()
+        finally:
+            try:
+                await pubsub.unsubscribe(self.channel)
+                await pubsub.close()
+            except Exception:
+                pass
@@ -0,0 +1,297 @@
+"""Хранилище временных рядов метрик устройств в PostgreSQL.
+
+* device_metrics - сырые значения, секционирование по дням (RANGE по timestamp);
+* device_metrics_1m - минутные агрегаты (min/max/avg/sum/count), секции по дням;
+* device_metrics_1h - часовые агрегаты, строятся из минутных.
+
+Хранение ограничивается удалением целых секций (DROP TABLE вместо
+DELETE), для часовых агрегатов - удалением по индексу bucket.
+
+Секции создаются на неделю вперёд. Строки, для дня которых секции нет
+(остановился планировщик обслуживания, у опрашивающего процесса
+сбиты часы), попадают в секцию DEFAULT, а не отклоняются; при
+создании секции дня они переносятся в неё.
+"""
+import datetime
+import logging
+import math
+import re
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+RAW_TABLE = "device_metrics"
+MINUTE_TABLE = "device_metrics_1m"
+HOUR_TABLE = "device_metrics_1h"
+PARTITIONED_TABLES = (RAW_TABLE, MINUTE_TABLE)
+# Колонка, по которой секционирована таблица
+PARTITION_KEYS = {RAW_TABLE: "timestamp", MINUTE_TABLE: "bucket"}
+
+_PARTITION_SUFFIX = re.compile(r"_p(\d{8})$")
+
+# Разрешения хранилища: (имя, таблица, шаг в секундах)
+RESOLUTIONS = (
+    ('raw', RAW_TABLE, 0),
+    ('1m', MINUTE_TABLE, 60),
+    ('1h', HOUR_TABLE, 3600),
+)
+
+# Агрегаты для сырых значений и для предагрегированных таблиц
+_RAW_AGGREGATES = {
+    'avg': "avg(metric_value)",
+    'min': "min(metric_value)",
+    'max': "max(metric_value)",
+    'p95': "percentile_cont(0.95) WITHIN GROUP (ORDER BY metric_value)",
+}
+_ROLLUP_AGGREGATES = {
+    'avg': "sum(sum_value) / sum(sample_count)",
+    'min': "min(min_value)",
+    'max': "max(max_value)",
+    # Оценка сверху: максимум p95 вложенных интервалов
+    'p95': "max(p95_value)",
+}
+AGGREGATES = tuple(_RAW_AGGREGATES)
+
+
+def _partition_name(table: str, day: datetime.date) -> str:
+    return f"{table}_p{day:%Y%m%d}"
+
+
+def prepare_legacy_tables(engine: Engine):
+    """Переименование несекционированной таблицы метрик из прежних версий.
+
+    create_all не меняет существующие таблицы, поэтому старая таблица
+    device_metrics сохраняется как device_metrics_legacy, а
+    секционированная создаётся заново. Перенос исторических данных -
+    INSERT INTO device_metrics SELECT ... FROM device_metrics_legacy.
+    """
+    with engine.begin() as conn:
+        relkind = conn.execute(
+            text("SELECT relkind FROM pg_class WHERE relname = :name AND relnamespace = 'public'::regnamespace"),
+            {"name": RAW_TABLE}
+        ).scalar()
+        if relkind == 'r':
+            logger.warning(f"Renaming unpartitioned {RAW_TABLE} to {RAW_TABLE}_legacy")
+            conn.execute(text(f"ALTER TABLE {RAW_TABLE} RENAME TO {RAW_TABLE}_legacy"))
+            conn.execute(text(f"ALTER SEQUENCE IF EXISTS {RAW_TABLE}_id_seq RENAME TO {RAW_TABLE}_legacy_id_seq"))
+            # Имена индексов уникальны в схеме - освобождаем их для новой таблицы
+            for (index_name,) in conn.execute(text(
+                "SELECT indexname FROM pg_indexes WHERE tablename = :table"
+            ), {"table": f"{RAW_TABLE}_legacy"}):
+                conn.execute(text(f'ALTER INDEX "{index_name}" RENAME TO "{index_name}_legacy"'))
+
+
+def prepare_time_indexes(engine: Engine):
+    """Индексы по времени для пересчёта агрегатов в таблицах прежних версий.
+
+    Минутный и часовой пересчёт выбирают строки только по времени;
+    без этих индексов каждый запуск читает всю секцию текущего дня.
+    """
+    with engine.begin() as conn:
+        for table, key in PARTITION_KEYS.items():
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table}_{key} ON {table} USING brin ({key})"))
+
+
+def _default_partition_name(table: str) -> str:
+    return f"{table}_default"
+
+
+def create_partition(conn: Connection, table: str, day: datetime.date):
+    """Создание секции дня; строки этого дня из секции DEFAULT переносятся в неё"""
+    name = _partition_name(table, day)
+    default = _default_partition_name(table)
+    key = PARTITION_KEYS[table]
+    bounds = f"FROM ('{day.isoformat()}') TO ('{(day + datetime.timedelta(days=1)).isoformat()}')"
+    where = f"{key} >= '{day.isoformat()}' AND {key} < '{(day + datetime.timedelta(days=1)).isoformat()}'"
+
+    if conn.execute(text(f"SELECT 1 FROM {default} WHERE {where} LIMIT 1")).first() is None:
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} FOR VALUES {bounds}"))
+        return
+    # Секция не создаётся, пока в DEFAULT есть строки её диапазона
+    logger.warning(f"Moving rows for {day} from {default} to new partition {name}")
+    conn.execute(text(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    conn.execute(text(f"INSERT INTO {name} SELECT * FROM {default} WHERE {where}"))
+    conn.execute(text(f"DELETE FROM {default} WHERE {where}"))
+    conn.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES {bounds}"))
+
+
+def ensure_partitions(conn: Connection, days_ahead: int = 7, days_back: int = 1,
+                      today: datetime.date = None):
+    """Создание секции DEFAULT и дневных секций на неделю вперёд"""
+    today = today or datetime.date.today()
+    for table in PARTITIONED_TABLES:
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {_default_partition_name(table)} PARTITION OF {table} DEFAULT"
+        ))
+        existing = set(list_partitions(conn, table))
+        for offset in range(-days_back, days_ahead + 1):
+            day = today + datetime.timedelta(days=offset)
+            if _partition_name(table, day) not in existing:
+                create_partition(conn, table, day)
+
+
+def list_partitions(conn: Connection, table: str) -> List[str]:
+    return [name for (name,) in conn.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = :table ORDER BY child.relname"
+    ), {"table": table})]
+
+
+def drop_expired_partitions(conn: Connection, table: str, retention_days: int,
+                            today: datetime.date = None) -> List[str]:
+    """Удаление секций, целиком вышедших за срок хранения"""
+    today = today or datetime.date.today()
+    cutoff = today - datetime.timedelta(days=retention_days)
+    dropped = []
+    for name in list_partitions(conn, table):
+        match = _PARTITION_SUFFIX.search(name)
+        if not match:
+            continue
+        day = datetime.datetime.strptime(match.group(1), "%Y%m%d").date()
+        # Секция содержит данные за [day, day + 1)
+        if day + datetime.timedelta(days=1) <= cutoff:
+            conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+            dropped.append(name)
+    # Строки за дни без своей секции
+    conn.execute(text(
+        f"DELETE FROM {_default_partition_name(table)} WHERE {PARTITION_KEYS[table]} < :cutoff"
+    ), {"cutoff": cutoff})
+    return dropped
+
+
+def delete_expired_rollups(conn: Connection, retention_days: int, now: datetime.datetime = None) -> int:
+    """Удаление часовых агрегатов старше срока хранения"""
+    now = now or datetime.datetime.now()
+    result = conn.execute(
+        text(f"DELETE FROM {HOUR_TABLE} WHERE bucket < :cutoff"),
+        {"cutoff": now - datetime.timedelta(days=retention_days)}
+    )
+    return result.rowcount
+
+
+def rollup_minutes(conn: Connection, since: datetime.datetime, until: datetime.datetime) -> int:
+    """Минутные агрегаты по сырым значениям за [since, until)"""
+    result = conn.execute(text(f"""
+        INSERT INTO {MINUTE_TABLE}
+            (device_ip, metric_name, bucket, min_value, max_value, avg_value, p95_value, sum_value, sample_count)
+        SELECT device_ip, metric_name, date_trunc('minute', timestamp),
+               min(metric_value), max(metric_value), avg(metric_value),
+               percentile_cont(0.95) WITHIN GROUP (ORDER BY metric_value),
+               sum(metric_value), count(*)
+        FROM {RAW_TABLE}
+        WHERE timestamp >= :since AND timestamp < :until
+        GROUP BY 1, 2, 3
+        ON CONFLICT (device_ip, metric_name, bucket) DO UPDATE SET
+            min_value = excluded.min_value,
+            max_value = excluded.max_value,
+            avg_value = excluded.avg_value,
+            p95_value = excluded.p95_value,
+            sum_value = excluded.sum_value,
+            sample_count = excluded.sample_count
+    """), {"since": since, "until": until})
+    return result.rowcount
+
+
+def rollup_hours(conn: Connection, since: datetime.datetime, until: datetime.datetime) -> int:
+    """Часовые агрегаты по минутным за [since, until)"""
+    result = conn.execute(text(f"""
+        INSERT INTO {HOUR_TABLE}
+            (device_ip, metric_name, bucket, min_value, max_value, avg_value, p95_value, sum_value, sample_count)
+        SELECT device_ip, metric_name, date_trunc('hour', bucket),
+               min(min_value), max(max_value), sum(sum_value) / sum(sample_count), max(p95_value),
+               sum(sum_value), sum(sample_count)
+        FROM {MINUTE_TABLE}
+        WHERE bucket >= :since AND bucket < :until
+        GROUP BY 1, 2, 3
+        ON CONFLICT (device_ip, metric_name, bucket) DO UPDATE SET
+            min_value = excluded.min_value,
+            max_value = excluded.max_value,
+            avg_value = excluded.avg_value,
+            p95_value = excluded.p95_value,
+            sum_value = excluded.sum_value,
+            sample_count = excluded.sample_count
+    """), {"since": since, "until": until})
+    return result.rowcount
+
+
+def run_rollups(engine: Engine, lookback_minutes: int = 10, now: datetime.datetime = None):
+    """Пересчёт агрегатов за последние закрытые интервалы.
+
+    Окно пересчёта выровнено по границам интервалов и с запасом
+    перекрывает предыдущий запуск, поэтому запоздавшие значения попадают
+    в агрегаты, а повторный пересчёт того же окна безопасен.
+    """
+    now = now or datetime.datetime.now()
+    minute = now.replace(second=0, microsecond=0)
+    hour = now.replace(minute=0, second=0, microsecond=0)
+
+    with engine.begin() as conn:
+        rollup_minutes(conn, minute - datetime.timedelta(minutes=lookback_minutes), minute)
+        # Текущий час пересчитывается по мере поступления минутных агрегатов
+        rollup_hours(conn, hour - datetime.timedelta(hours=1), minute)
+
+
+def maintain_storage(engine: Engine, raw_days: int, minute_days: int, hour_days: int):
+    """Создание будущих секций и удаление устаревших данных"""
+    with engine.begin() as conn:
+        ensure_partitions(conn)
+        for table, days in ((RAW_TABLE, raw_days), (MINUTE_TABLE, minute_days)):
+            dropped = drop_expired_partitions(conn, table, days)
+            if dropped:
+                logger.info(f"Dropped expired partitions: {', '.join(dropped)}")
+        delete_expired_rollups(conn, hour_days)
+
+
+def choose_resolution(start: datetime.datetime, step: int, retention_days: Dict[str, int],
+                      now: Optional[datetime.datetime] = None):
+    """Самое дешёвое разрешение, которое покрывает начало диапазона и не мельче шага"""
+    now = now or datetime.datetime.now()
+    candidates = [
+        resolution for resolution in RESOLUTIONS
+        if start >= now - datetime.timedelta(days=retention_days[resolution[0]])
+    ] or [RESOLUTIONS[-1]]
+
+    # Самое грубое разрешение, шаг которого не превышает запрошенный
+    chosen = candidates[0]
+    for resolution in candidates:
+        if resolution[2] <= step:
+            chosen = resolution
+    return chosen
+
+
+def query_series(conn: Connection, device_ip: str, metric: str, start: datetime.datetime,
+                 end: datetime.datetime, step: int, aggregates: Sequence[str],
+                 retention_days: Dict[str, int], max_points: int = 5000) -> Dict:
+    """Агрегирование ряда метрики по интервалам step секунд одним запросом.
+
+    Результат - колонки массивов: t (unix-время начала интервала) и по
+    массиву на каждый агрегат.
+    """
+    step = max(int(step), 1, math.ceil((end - start).total_seconds() / max_points))
+    name, table, resolution_step = choose_resolution(start, step, retention_days)
+    step = max(step, resolution_step)
+
+    if table == RAW_TABLE:
+        time_column, expressions = "timestamp", _RAW_AGGREGATES
+    else:
+        time_column, expressions = "bucket", _ROLLUP_AGGREGATES
+
+    columns = ", ".join(expressions[aggregate] for aggregate in aggregates)
+    rows = conn.execute(text(f"""
+        SELECT floor(extract(epoch FROM {time_column}) / :step) * :step AS t, {columns}
+        FROM {table}
+        WHERE device_ip = :device_ip AND metric_name = :metric
+          AND {time_column} >= :start AND {time_column} < :end
+        GROUP BY 1
+        ORDER BY 1
+    """), {"step": step, "device_ip": device_ip, "metric": metric, "start": start, "end": end}).all()
+
+    series = {"resolution": name, "step": step, "t": [int(row[0]) for row in rows]}
+    for position, aggregate in enumerate(aggregates, start=1):
+        series[aggregate] = [row[position] for row in rows]
+    return series